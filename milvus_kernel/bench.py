@@ -0,0 +1,137 @@
+import time
+import threading
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .timing import submit, frame
+
+
+def load_ground_truth(path):
+    """Exact neighbor ids, one row per query, from a .npy or .ivecs file."""
+    if path.lower().endswith('.ivecs'):
+        raw = np.memmap(path, dtype='int32', mode='r')
+        return raw.reshape(-1, int(raw[0])+1)[:, 1:]
+    return np.load(path, mmap_mode='r')
+
+
+def fetch_collection(engine, collection_name, stats, chunk_size=10000):
+    """Pull every vector of a collection back, segment by segment, for brute-force ground truth."""
+    ids, vectors = [], []
+    for partition in stats.get('partitions', []):
+        for segment in partition.get('segments') or []:
+            status, segment_ids = engine.list_id_in_segment(collection_name, segment['name'])
+            if not status.OK():
+                raise Exception(status.message)
+            for offset in range(0, len(segment_ids), chunk_size):
+                chunk = segment_ids[offset:offset+chunk_size]
+                status, chunk_vectors = engine.get_entity_by_id(collection_name, chunk)
+                if not status.OK():
+                    raise Exception(status.message)
+                keep = [i for i, v in enumerate(chunk_vectors) if len(v)]
+                ids.append(np.asarray(chunk, dtype='int64')[keep])
+                vectors.append(np.asarray([chunk_vectors[i] for i in keep], dtype='float32'))
+    if not ids:
+        raise ValueError(f'Collection {collection_name} is empty, there is nothing to compute ground truth against.')
+    return np.concatenate(ids), np.vstack(vectors)
+
+
+def exact_neighbors(queries, base, top_k, metric='L2', ids=None, chunk_size=65536):
+    """Brute-force top_k over `base` in chunks: one matrix product per chunk and an argpartition to keep the best."""
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    best_score = np.full((len(queries), 0), np.inf, dtype='float32')
+    best_index = np.empty((len(queries), 0), dtype='int64')
+    for offset in range(0, len(base), chunk_size):
+        chunk = np.ascontiguousarray(base[offset:offset+chunk_size], dtype='float32')
+        if metric=='IP':
+            score = -queries@chunk.T
+        else:
+            score = (queries**2).sum(1)[:, None]-2*queries@chunk.T+(chunk**2).sum(1)[None, :]
+        score = np.hstack([best_score, score])
+        index = np.hstack([best_index, np.broadcast_to(np.arange(offset, offset+len(chunk)), score[:, best_index.shape[1]:].shape)])
+        keep = np.argpartition(score, min(top_k, score.shape[1]-1), axis=1)[:, :top_k]
+        best_score = np.take_along_axis(score, keep, 1)
+        best_index = np.take_along_axis(index, keep, 1)
+    order = np.argsort(best_score, axis=1)
+    best_index = np.take_along_axis(best_index, order, 1)
+    return best_index if ids is None else np.asarray(ids)[best_index]
+
+
+def recall_at_k(result_ids, ground_truth, top_k):
+    """Mean share of the true top_k found in each returned top_k; -1 pads missing hits."""
+    truth = np.asarray(ground_truth)[:, :top_k]
+    found = (result_ids[:, :top_k, None]==truth[:, None, :]).any(axis=2)
+    return float(found.sum(axis=1).mean()/top_k)
+
+
+def warm_up(pool, workers, engine, collection_name, queries, top_k, params):
+    """Send one search from each of the pool's `workers` threads so that no timed request pays for opening a channel."""
+    barrier = threading.Barrier(workers)
+
+    def work():
+        # Holding every thread at the barrier makes the pool start all `workers` threads.
+        barrier.wait()
+        status, _ = engine.search(collection_name=collection_name, top_k=top_k,
+                                  query_records=np.ascontiguousarray(queries[:1], dtype='float32'), params=params)
+        if not status.OK():
+            raise Exception(status.message)
+
+    for future in [pool.submit(work) for _ in range(workers)]:
+        future.result()
+
+
+def run_setting(pool, engine, collection_name, queries, top_k, params, concurrency, nq=1):
+    """Search every query once with `concurrency` workers on `pool`, each sending nq queries per request."""
+    result_ids = np.full((len(queries), top_k), -1, dtype='int64')
+    offsets = iter(range(0, len(queries), nq))
+    lock = threading.Lock()
+
+    def work():
+        latencies = []
+        while True:
+            with lock:
+                offset = next(offsets, None)
+            if offset is None:
+                return latencies
+            start = time.perf_counter()
+            status, result = engine.search(collection_name=collection_name, top_k=top_k,
+                                           query_records=np.ascontiguousarray(queries[offset:offset+nq], dtype='float32'),
+                                           params=params)
+            latencies.append(time.perf_counter()-start)
+            if not status.OK():
+                raise Exception(status.message)
+            for i, row in enumerate(result.id_array):
+                result_ids[offset+i, :len(row)] = row[:top_k]
+
+    start = time.perf_counter()
+    latencies = [i for future in [submit(pool, work) for _ in range(concurrency)] for i in future.result()]
+    seconds = time.perf_counter()-start
+    return result_ids, np.array(latencies), seconds
+
+
+def sweep(engine, collection_name, queries, ground_truth, sweep_params, progress=None):
+    """Run every combination of nprobe, top_k and concurrency and tabulate QPS, latency and recall@k.
+
+    All settings share one pool, warmed up first, so no setting's timings include channel setup.
+    """
+    rows = []
+    nq = sweep_params['nq']
+    settings = list(product(sweep_params['nprobe'], sweep_params['top_k'], sweep_params['concurrency']))
+    workers = max(sweep_params['concurrency'])
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='milvus_kernel_bench') as pool:
+        nprobe, top_k, _ = settings[0]
+        warm_up(pool, workers, engine, collection_name, queries, top_k, None if nprobe is None else {'nprobe':nprobe})
+        for n, (nprobe, top_k, concurrency) in enumerate(settings):
+            params = None if nprobe is None else {'nprobe':nprobe}
+            result_ids, latencies, seconds = run_setting(pool, engine, collection_name, queries, top_k, params, concurrency, nq)
+            recall = None
+            if ground_truth is not None:
+                sample, truth = ground_truth
+                recall = round(recall_at_k(result_ids[sample], truth, top_k), 4)
+            rows.append([nprobe, top_k, concurrency, len(queries), round(len(queries)/seconds, 2),
+                         round(latencies.mean()*1000, 3), round(np.percentile(latencies, 99)*1000, 3), recall])
+            if progress is not None:
+                progress(f'[{n+1}/{len(settings)}] nprobe={nprobe} top_k={top_k} concurrency={concurrency}: '
+                         f'{rows[-1][4]} qps, recall@{top_k}={recall}\n')
+    return frame(rows, columns=['nprobe', 'top_k', 'concurrency', 'queries', 'qps', 'mean_ms', 'p99_ms', 'recall@k'])
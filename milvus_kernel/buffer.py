@@ -0,0 +1,131 @@
+import threading
+
+import numpy as np
+
+
+# Statements that must see every buffered row of the collections they name.
+DRAINS = ('search', 'get_by_id', 'delete', 'stats', 'desc', 'bench', 'flush', 'compact', 'insert_file',
+          'create_index', 'drop_index', 'create_partition', 'drop_partition', 'create_table', 'drop_table')
+
+
+class Ticket:
+    """One buffered insert statement; `ids` is filled in when its batch is sent."""
+    def __init__(self, number, collection_name, partition_tag, rows, ids=None):
+        self.number = number
+        self.collection_name = collection_name
+        self.partition_tag = partition_tag
+        self.rows = rows
+        self.ids = ids
+        self.auto = ids is None
+        self.error = None
+        self.reported = False
+
+
+class Batch:
+    """Rows waiting for one (collection, partition_tag), held in arrays allocated once at full size."""
+    def __init__(self, engine, max_rows, dimension):
+        self.engine = engine
+        self.vectors = np.empty((max_rows, dimension), dtype='float32')
+        self.ids = np.empty(max_rows, dtype='int64')
+        self.user_ids = None
+        self.rows = 0
+        self.tickets = []
+        self.timer = None
+
+    def fits(self, vectors, ids):
+        return (self.rows+len(vectors)<=len(self.vectors) and vectors.shape[1]==self.vectors.shape[1]
+                and (self.user_ids is None or self.user_ids==(ids is not None)))
+
+
+class InsertBuffer:
+    """Opt-in write-behind buffer that turns many small inserts into one RPC per batch.
+
+    A batch is sent when it reaches `max_rows`, `max_ms` after its first row, or when `drain`
+    is called for its collection. Ids chosen by the caller are known at once; ids assigned by
+    the server are handed out through `completed` once the batch has been sent; `on_expire`, if set,
+    is called after the `max_ms` timer has sent a batch.
+    """
+    def __init__(self, max_rows=10000, max_ms=200):
+        self.enabled = False
+        self.max_rows = max_rows
+        self.max_ms = max_ms
+        self.batches = {}
+        self.done = []
+        self.count = 0
+        self.on_expire = None
+        self.lock = threading.RLock()
+
+    def add(self, engine, uri, collection_name, vectors, ids=None, partition_tag=None):
+        key = (uri, collection_name, partition_tag)
+        with self.lock:
+            self.count += 1
+            ticket = Ticket(self.count, collection_name, partition_tag, len(vectors), ids)
+            batch = self.batches.get(key)
+            if batch is not None and not batch.fits(vectors, ids):
+                self._send(key)
+                batch = None
+            if len(vectors)>=self.max_rows:
+                self._insert(engine, collection_name, partition_tag, vectors, ids, [ticket])
+                return ticket
+            if batch is None:
+                batch = self.batches[key] = Batch(engine, self.max_rows, vectors.shape[1])
+                batch.user_ids = ids is not None
+                batch.timer = threading.Timer(self.max_ms/1000, self._expire, (key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+            batch.vectors[batch.rows:batch.rows+len(vectors)] = vectors
+            if ids is not None:
+                batch.ids[batch.rows:batch.rows+len(vectors)] = ids
+            batch.rows += len(vectors)
+            batch.tickets.append(ticket)
+            if batch.rows==self.max_rows:
+                self._send(key)
+            return ticket
+
+    def _expire(self, key, batch):
+        with self.lock:
+            if self.batches.get(key) is not batch:
+                return
+            self._send(key)
+        if self.on_expire is not None:
+            self.on_expire()
+
+    def _send(self, key):
+        batch = self.batches.pop(key)
+        batch.timer.cancel()
+        ids = batch.ids[:batch.rows] if batch.user_ids else None
+        self._insert(batch.engine, key[1], key[2], batch.vectors[:batch.rows], ids, batch.tickets)
+
+    def _insert(self, engine, collection_name, partition_tag, vectors, ids, tickets):
+        try:
+            status, inserted = engine.insert(collection_name=collection_name, records=vectors,
+                                             ids=None if ids is None else ids.tolist(), partition_tag=partition_tag)
+            error = None if status.OK() else status.message
+        except Exception as e:
+            error = str(e)
+        offset = 0
+        for ticket in tickets:
+            if error is not None:
+                ticket.error = error
+            elif ticket.ids is None:
+                ticket.ids = np.asarray(inserted[offset:offset+ticket.rows], dtype='int64')
+            offset += ticket.rows
+        self.done.extend(i for i in tickets if i.auto or i.error is not None)
+
+    def drain(self, uri=None, collection_name=None):
+        """Send every waiting batch of a collection on `uri`; with no arguments, send everything."""
+        with self.lock:
+            for key in [i for i in self.batches if uri in (None, i[0]) and collection_name in (None, i[1])]:
+                self._send(key)
+
+    def pending(self):
+        with self.lock:
+            return sum(i.rows for i in self.batches.values())
+
+    def completed(self):
+        """Tickets sent since the last call, in the order their statements ran."""
+        with self.lock:
+            done, self.done = [i for i in self.done if not i.reported], []
+            for ticket in done:
+                ticket.reported = True
+        return sorted(done, key=lambda i: i.number)
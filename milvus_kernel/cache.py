@@ -0,0 +1,168 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# What each statement kind makes stale on the collections it touches.
+INVALIDATES = {
+    'create_table':('info', 'index', 'partitions', 'stats'),
+    'drop_table':('info', 'index', 'partitions', 'stats'),
+    'create_partition':('partitions', 'stats'),
+    'drop_partition':('partitions', 'stats'),
+    'create_index':('index', 'stats'),
+    'drop_index':('index', 'stats'),
+    'insert':('stats',),
+    'insert_file':('stats',),
+    'delete':('stats',),
+    'compact':('stats',),
+    'flush':('stats',),
+}
+
+BINARY_METRICS = ('HAMMING', 'JACCARD', 'TANIMOTO', 'SUBSTRUCTURE', 'SUPERSTRUCTURE')
+
+
+class MetadataCache:
+    """Collection schema, index params, partitions and stats of one connection, kept for `ttl` seconds."""
+    loaders = {'info':'get_collection_info', 'index':'get_index_info',
+               'partitions':'list_partitions', 'stats':'get_collection_stats'}
+
+    def __init__(self, client, ttl=60):
+        self.client = client
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, collection_name, kind):
+        key = (collection_name, kind)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic()-entry[0]<self.ttl:
+                return entry[1]
+        status, value = getattr(self.client, self.loaders[kind])(collection_name)
+        if not status.OK():
+            raise Exception(status.message)
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+        return value
+
+    def info(self, collection_name):
+        return self.get(collection_name, 'info')
+
+    def index(self, collection_name):
+        return self.get(collection_name, 'index')
+
+    def partitions(self, collection_name):
+        return self.get(collection_name, 'partitions')
+
+    def stats(self, collection_name):
+        return self.get(collection_name, 'stats')
+
+    def revalidate(self, collection_name, kind, current):
+        """Keep a cached entry, however old, while `current(value)` says it still holds; otherwise load it again.
+
+        Returns the value and whether it was re-fetched.
+        """
+        key = (collection_name, kind)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and current(entry[1]):
+            with self.lock:
+                self.entries[key] = (time.monotonic(), entry[1])
+            return entry[1], False
+        self.invalidate(collection_name, (kind,))
+        return self.get(collection_name, kind), True
+
+    def invalidate(self, collection_name, kinds=None):
+        with self.lock:
+            for kind in kinds or self.loaders:
+                self.entries.pop((collection_name, kind), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def check_dimension(self, collection_name, vectors):
+        """Reject vectors of the wrong length locally, before any RPC carries them."""
+        info = self.info(collection_name)
+        metric = getattr(info.metric_type, 'name', str(info.metric_type))
+        if metric not in BINARY_METRICS and vectors.shape[1]!=info.dimension:
+            raise ValueError(f'Collection {collection_name} has dimension {info.dimension}, '
+                             f'got vectors of dimension {vectors.shape[1]}.')
+
+
+class SearchCache:
+    """Opt-in LRU of search results, bounded by entry count and by bytes held."""
+    def __init__(self, max_entries=1024, max_mb=256):
+        self.enabled = False
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb*(1<<20))
+        self.entries = OrderedDict()
+        self.collections = {}
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(uri, collection_name, partition_tags, top_k, params, queries):
+        digest = hashlib.blake2b(np.ascontiguousarray(queries, dtype='float32').tobytes(), digest_size=16)
+        digest.update(str(queries.shape).encode())
+        return (uri, collection_name, tuple(partition_tags or ()), top_k,
+                tuple(sorted((params or {}).items())), digest.hexdigest())
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+    @staticmethod
+    def owners(key):
+        uris = key[0] if isinstance(key[0], tuple) else (key[0],)
+        return [(i, key[1]) for i in uris]
+
+    def put(self, key, arrays):
+        nbytes = sum(i.nbytes for i in arrays.values())
+        if nbytes>self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (arrays, nbytes)
+            for owner in self.owners(key):
+                self.collections.setdefault(owner, set()).add(key)
+            self.nbytes += nbytes
+            while len(self.entries)>self.max_entries or self.nbytes>self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes = self.entries.pop(key)
+        self.nbytes -= nbytes
+        for owner in self.owners(key):
+            self.collections.get(owner, set()).discard(key)
+
+    def invalidate(self, uri, collection_name):
+        """Drop every cached result of a collection, including fan-out results that involved `uri`."""
+        with self.lock:
+            for key in list(self.collections.pop((uri, collection_name), ())):
+                if key in self.entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.collections.clear()
+            self.nbytes = 0
+
+    def frame(self):
+        lookups = self.hits+self.misses
+        return pd.DataFrame({'description':['enabled', 'entries', 'max_entries', 'bytes', 'max_bytes',
+                                            'hits', 'misses', 'hit_rate', 'evictions'],
+                             'info':[self.enabled, len(self.entries), self.max_entries, self.nbytes, self.max_bytes,
+                                     self.hits, self.misses, round(self.hits/lookups, 4) if lookups else None, self.evictions]})
@@ -0,0 +1,116 @@
+import time
+import threading
+import contextvars
+
+import pandas as pd
+
+from .cache import MetadataCache
+from .timing import TimedClient
+
+
+# The connection a background job was submitted on; statements use it instead of the pool's current one.
+bound = contextvars.ContextVar('milvus_kernel_connection', default=None)
+
+class Connection:
+    def __init__(self, name, uri, client, metadata=None):
+        self.name = name
+        self.uri = uri
+        self.client = client
+        self.metadata = MetadataCache(client) if metadata is None else metadata
+        self.healthy = None
+        self.latency = None
+        self.checked = None
+
+    def check(self, timeout=2):
+        start = time.perf_counter()
+        try:
+            status, _ = self.client.server_status(timeout=timeout)
+            self.healthy = status.OK()
+        except Exception:
+            self.healthy = False
+        self.latency = time.perf_counter()-start
+        self.checked = time.time()
+        return self.healthy
+
+
+class ConnectionPool:
+    """Named Milvus connections, with one client shared by every name that points at the same uri."""
+    def __init__(self, factory):
+        self.factory = factory
+        self.connections = {}
+        self.current = None
+        self.lock = threading.Lock()
+
+    def connect(self, uri, name='default'):
+        """Open `name`; a connection already called `name` is replaced and its client closed unless still shared."""
+        with self.lock:
+            replaced = self.connections.get(name)
+            shared = None
+            for connection in self.connections.values():
+                if connection.uri==uri and connection.check():
+                    shared = connection
+                    break
+            if shared is None:
+                self.connections[name] = Connection(name, uri, TimedClient(self.factory(uri)))
+            else:
+                self.connections[name] = Connection(name, uri, shared.client, shared.metadata)
+            if replaced is not None:
+                self._release(replaced.client)
+            self.current = name
+            return self.connections[name]
+
+    def get(self, name=None):
+        name = self.current if name is None else name
+        if name not in self.connections:
+            raise ValueError(f'No such connection: {name}')
+        return self.connections[name]
+
+    def use(self, name):
+        self.current = self.get(name).name
+        return self.connections[name]
+
+    def disconnect(self, name):
+        with self.lock:
+            connection = self.connections.pop(self.get(name).name)
+            self._release(connection.client)
+            if self.current==name:
+                self.current = None
+            return connection
+
+    def _release(self, client):
+        """Close `client` once no remaining connection uses it."""
+        if all(i.client is not client for i in self.connections.values()):
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Close every client and forget all connections."""
+        with self.lock:
+            for client in {id(i.client):i.client for i in self.connections.values()}.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self.connections.clear()
+            self.current = None
+
+    def resolve(self, names):
+        """Connections for an `on a, b` clause; `*` selects every connection."""
+        if '*' in names:
+            return list(self.connections.values())
+        return [self.get(i) for i in names]
+
+    @property
+    def engine(self):
+        return self.connections[self.current].client if self.current is not None else False
+
+    def frame(self, check=True):
+        rows = []
+        for connection in self.connections.values():
+            if check:
+                connection.check()
+            rows.append([connection.name, connection.uri, connection.name==self.current, connection.healthy,
+                         None if connection.latency is None else round(connection.latency*1000, 3)])
+        return pd.DataFrame(rows, columns=['name', 'uri', 'current', 'healthy', 'latency_ms'])
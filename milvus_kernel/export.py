@@ -0,0 +1,154 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .timing import submit
+
+
+class NpyWriter:
+    """Writes records into a structured .npy file memory-mapped at its largest possible size.
+
+    Chunks are copied straight into the mapping; on close the header is rewritten and the
+    file truncated to the rows actually written.
+    """
+    def __init__(self, path, dtype, max_rows):
+        self.path = path
+        self.array = np.lib.format.open_memmap(path, mode='w+', dtype=np.dtype(dtype), shape=(max_rows,))
+        self.offset = self.array.offset
+        self.rows = 0
+
+    def write(self, columns):
+        n = len(next(iter(columns.values())))
+        for name, values in columns.items():
+            self.array[name][self.rows:self.rows+n] = values
+        self.rows += n
+
+    def close(self):
+        self.array.flush()
+        dtype, max_rows = self.array.dtype, len(self.array)
+        del self.array
+        if self.rows<max_rows:
+            with open(self.path, 'r+b') as f:
+                version = np.lib.format.read_magic(f)
+                start = f.tell()
+                header = repr({'descr':np.lib.format.dtype_to_descr(dtype), 'fortran_order':False, 'shape':(self.rows,)})
+                # The new shape is never longer than the old one, so pad to the same length and keep the data offset.
+                f.seek(start+(2 if version==(1, 0) else 4))
+                f.write(header.ljust(self.offset-f.tell()-1).encode('latin1')+b'\n')
+                f.truncate(self.offset+self.rows*dtype.itemsize)
+
+
+class ParquetWriter:
+    """Writes every chunk as one Parquet row group; 2-D columns become fixed-size lists.
+
+    The file and its schema are created up front from `dtype`, so a result with no rows still leaves a valid file.
+    """
+    def __init__(self, path, dtype, max_rows=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Writing .parquet files requires pyarrow: pip install pyarrow')
+        self.pa = pa
+        self.path = path
+        fields = []
+        for name, (kind, _) in np.dtype(dtype).fields.items():
+            if kind.shape:
+                fields.append(pa.field(name, pa.list_(pa.from_numpy_dtype(kind.base), kind.shape[0])))
+            else:
+                fields.append(pa.field(name, pa.from_numpy_dtype(kind)))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.rows = 0
+
+    def write(self, columns):
+        pa = self.pa
+        arrays = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.ndim==2:
+                arrays[name] = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1])
+            else:
+                arrays[name] = pa.array(values)
+        table = pa.table(arrays, schema=self.schema)
+        self.writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, dtype, max_rows):
+    ext = os.path.splitext(path)[1].lower()
+    if ext=='.npy':
+        return NpyWriter(path, dtype, max_rows)
+    if ext=='.parquet':
+        return ParquetWriter(path, dtype, max_rows)
+    raise ValueError(f"Unsupported output file '{path}', expected .npy or .parquet.")
+
+
+def id_chunks(ids, id_range, chunk_size):
+    """Slices of an id array, or of an inclusive (low, high) range generated one chunk at a time."""
+    if id_range is not None:
+        low, high = id_range
+        for start in range(low, high+1, chunk_size):
+            yield np.arange(start, min(start+chunk_size, high+1), dtype='int64')
+    else:
+        for start in range(0, len(ids), chunk_size):
+            yield np.asarray(ids[start:start+chunk_size], dtype='int64')
+
+
+def export_entities(engine, collection_name, dimension, path, ids=None, id_range=None, chunk_size=10000, progress=None):
+    """Stream `get_entity_by_id` over the ids in chunks into an (id, vector) file; ids that are not found are skipped.
+
+    The next chunk is requested while the previous one is being written, so memory stays at
+    about two chunks whatever the number of ids. `progress` gets (ids scanned, total ids, seconds).
+    Returns (rows, missing, seconds).
+    """
+    total = (id_range[1]-id_range[0]+1) if id_range is not None else len(ids)
+    writer = open_writer(path, [('id', 'int64'), ('vector', 'float32', (dimension,))], total)
+    start = time.perf_counter()
+    done = [0]
+
+    def collect(future, chunk):
+        status, vectors = future.result()
+        if not status.OK():
+            raise Exception(status.message)
+        found = np.fromiter(map(len, vectors), dtype='int64', count=len(vectors))>0
+        if found.any():
+            writer.write({'id':chunk[found], 'vector':np.array([v for v in vectors if len(v)], dtype='float32')})
+        done[0] += len(chunk)
+        if progress is not None:
+            progress(done[0], total, time.perf_counter()-start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            for chunk in id_chunks(ids, id_range, chunk_size):
+                future = submit(pool, engine.get_entity_by_id, collection_name=collection_name, ids=chunk.tolist())
+                if pending is not None:
+                    collect(*pending)
+                pending = (future, chunk)
+            if pending is not None:
+                collect(*pending)
+    finally:
+        writer.close()
+    return writer.rows, total-writer.rows, time.perf_counter()-start
+
+
+def export_results(parts, path, max_rows, shard=False):
+    """Write search result arrays (query_idx, rank, id, distance[, shard]) chunk by chunk as they arrive."""
+    dtype = [('query_idx', 'int64'), ('rank', 'int64'), ('id', 'int64'), ('distance', 'float32')]
+    if shard:
+        dtype.append(('shard', 'U64'))
+    writer = open_writer(path, dtype, max_rows)
+    start = time.perf_counter()
+    try:
+        for part in parts:
+            if len(part['id']):
+                writer.write({i:part[i].astype(str) if i=='shard' else part[i] for i in part})
+    finally:
+        writer.close()
+    return writer.rows, time.perf_counter()-start
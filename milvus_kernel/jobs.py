@@ -0,0 +1,104 @@
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pandas as pd
+
+
+def index_progress(engine, collection_name):
+    """Share of rows sitting in segments that already carry a built index, from `get_collection_stats`."""
+    status, stats = engine.get_collection_stats(collection_name)
+    if not status.OK() or not stats:
+        return None
+    total = indexed = 0
+    for partition in stats.get('partitions', []):
+        for segment in partition.get('segments') or []:
+            total += segment.get('row_count', 0)
+            if segment.get('index_name', 'IDMAP') not in ('IDMAP', 'FLAT', ''):
+                indexed += segment.get('row_count', 0)
+    return indexed/total if total else None
+
+
+class Job:
+    def __init__(self, job_id, statement, future, progress=None):
+        self.id = job_id
+        self.statement = statement
+        self.future = future
+        self.progress = progress
+        self.started = time.time()
+        self.finished = None
+        self.cancelled = False
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.finished = time.time()
+
+    @property
+    def status(self):
+        if self.future.cancelled():
+            return 'cancelled'
+        if not self.future.done():
+            if self.cancelled:
+                return 'cancelling'
+            return 'running' if self.future.running() else 'pending'
+        if self.cancelled:
+            return 'cancelled'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    @property
+    def elapsed(self):
+        return round((self.finished or time.time())-self.started, 3)
+
+    def info(self):
+        progress = None
+        if self.progress is not None and self.status=='running':
+            try:
+                progress = self.progress()
+            except Exception:
+                progress = None
+        return {'job_id':self.id, 'statement':self.statement, 'status':self.status, 'elapsed':self.elapsed,
+                'progress':'' if progress is None else f'{progress:.1%}'}
+
+
+class JobManager:
+    """Runs statements on a small worker pool so long server-side operations don't block the kernel."""
+    def __init__(self, max_workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='milvus-job')
+        self.jobs = {}
+        self.counter = itertools.count(1)
+
+    def submit(self, statement, fn, progress=None):
+        job_id = next(self.counter)
+        self.jobs[job_id] = Job(job_id, statement, self.pool.submit(fn), progress)
+        return self.jobs[job_id]
+
+    def get(self, job_id):
+        if job_id not in self.jobs:
+            raise ValueError(f'No such job: {job_id}')
+        return self.jobs[job_id]
+
+    def cancel(self, job_id):
+        """Pending jobs are dropped; running ones can't be stopped server-side, so their result is discarded."""
+        job = self.get(job_id)
+        if not job.future.cancel() and not job.future.done():
+            job.cancelled = True
+        return job
+
+    def wait(self, job_id, timeout=None):
+        job = self.get(job_id)
+        deadline = None if timeout is None else time.time()+timeout
+        while True:
+            try:
+                # Short slices keep the wait interruptible from the notebook.
+                job.future.result(timeout=0.2)
+                break
+            except TimeoutError:
+                if deadline is not None and time.time()>=deadline:
+                    break
+            except Exception:
+                break
+        return job
+
+    def frame(self, jobs=None):
+        jobs = self.jobs.values() if jobs is None else jobs
+        return pd.DataFrame([i.info() for i in jobs], columns=['job_id', 'statement', 'status', 'elapsed', 'progress'])
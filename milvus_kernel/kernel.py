@@ -1,10 +1,91 @@
+import html
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 from milvus import Milvus, IndexType, MetricType
 from ipykernel.kernelbase import Kernel
 
+from .parser import parse, split_statements, MilvusSQLSyntaxError
+from .vectors import open_vectors, open_ids, pipeline_insert
+from .search import batched_search, iter_search, fanout_search, result_frame
+from .export import export_entities, export_results
+from .connections import ConnectionPool, bound
+from .render import Pager, Page
+from .cache import INVALIDATES, BINARY_METRICS, SearchCache
+from .bench import load_ground_truth, fetch_collection, exact_neighbors, sweep
+from .timing import StatementTiming, Profiler, current, timed, frame
+from .jobs import JobManager, index_progress
+from .stats import stats_frame, building
+from .local import LocalMilvus
+from .buffer import InsertBuffer, DRAINS
+from .scheduler import Scheduler, Skipped, waves
+
 
 __version__ = '0.2.0'
 
+HELP = [
+    ('Create a collection', "create table test01 where dimension=128 and index_file_size=1024 and metric_type='L2'"),
+    ('Drop a collection', 'drop table test01'),
+    ('Show all collections', 'list table'),
+    ('Create a partition', "create partition test01 where partition_tag='tag01'"),
+    ('Drop a partition', "drop partition test01 where partition_tag='tag01'"),
+    ('Show all partitions in a collection', 'list partitions test01'),
+    ('Create an index', "create index test01 where index_type='FLAT' and nlist=4096"),
+    ('Removes an index', 'drop index test01'),
+    ('Flush data', 'flush test01, test02'),
+    ('Compact all segments in a collection', 'compact test01'),
+    ('Search vectors', "select 2, 3, 5 from test01 where top_k=1 and partition_tags='tag01' and nprobe=16"),
+    ('Search many vectors in nq-sized batches', "select 'queries.npy' from test01 where top_k=10 and nprobe=16 and nq=512"),
+    ('Delete vectors by ID', 'delete test01 by id=1'),
+    ('Insert a vector', "insert 2,3,5 from test01 where partition_tag='tag01' by id=0"),
+    ('Bulk insert vectors from a .npy/.fvecs/.bvecs file',
+     "insert from 'base.fvecs' into test01 where partition_tag='tag01' by ids from 'ids.npy' batch_size=50000"),
+    ('Select vector', 'select test01 by id=1,2,3'),
+    ('Export vectors by id, id range or id file to .npy/.parquet',
+     "select test01 by id between 0 and 9999999 into 'vectors.parquet' batch_size=50000"),
+    ('Export search results to .npy/.parquet', "select 'queries.npy' from test01 where top_k=10 into 'results.npy'"),
+    ('View metric type', 'help -metric'),
+    ('View index type', 'help -index'),
+    ('View a collection description', 'desc test01'),
+    ('View a collection statistics', 'stats test01'),
+    ('View per-segment statistics of collections', 'stats test01, test02 segments'),
+    ('Re-fetch statistics only of collections that changed', 'stats test01, test02 refresh'),
+    ('Open a named connection', 'milvus://127.0.0.1:19530 as shardA'),
+    ('Open an in-process engine that keeps its data in a directory', 'milvus://local/data/milvus as scratch'),
+    ('Switch the current connection', 'use shardA'),
+    ('Show connections and their health', 'list connections'),
+    ('Close a named connection', 'disconnect shardA'),
+    ('Search a collection on several connections and merge the top_k',
+     'select 2, 3, 5 from test01 on shardA, shardB where top_k=10 and nprobe=16'),
+    ('Show the next page of the last result', 'more'),
+    ('Show a page of the last result', 'page 3'),
+    ('Set the number of rows shown per page', 'set page_size=100'),
+    ('Set the largest page sent to the notebook, in KB', 'set page_kb=512'),
+    ('Set how long collection metadata is cached, in seconds', 'set metadata_ttl=60'),
+    ('Cache search results on the client', 'set search_cache on entries=1024 mb=256'),
+    ('Buffer inserts and send them in batches of rows or after ms', 'set insert_buffer rows=10000 ms=200'),
+    ('Show search cache hits, misses, evictions and size', 'cache stats'),
+    ('Empty the search cache', 'cache clear'),
+    ('Show the time spent per phase after every cell', 'set timing on'),
+    ('Run a statement once and show where its time went', "explain analyze select 'queries.npy' from test01 where top_k=10"),
+    ('Show p50/p95/p99 latency per statement type and collection', 'profile'),
+    ('Benchmark QPS, latency and recall over a parameter sweep',
+     "bench test01 with queries from 'q.npy' ground_truth from 'gt.npy' sweep nprobe=1,8,32,128 top_k=10 concurrency=1,4,16"),
+    ('Run a statement as a background job', "background create index test01 where index_type='IVF_FLAT' and nlist=4096"),
+    ('Show background jobs', 'jobs'),
+    ('Wait for a background job', 'wait 1 where timeout=60'),
+    ('Cancel a background job', 'cancel 1'),
+]
+
+
+def open_client(uri):
+    """A Milvus client for `host:port`, or the in-process engine for `local[/absolute/path]`."""
+    if uri=='local' or uri.startswith('local/'):
+        return LocalMilvus('/'+uri[5:].lstrip('/') if uri[5:].strip('/') else None)
+    return Milvus(uri=f'tcp://{uri}')
+
 class MilvusKernel(Kernel):
     implementation = 'milvus_kernel'
     implementation_version = __version__
@@ -14,18 +95,53 @@ class MilvusKernel(Kernel):
                      'mimetype': 'text/x-sh',
                      'file_extension': '.sql'}
     banner = 'milvus kernel'
+    offline = ('connect', 'use', 'disconnect', 'list_connections', 'help', 'jobs', 'wait', 'cancel', 'more', 'page', 'set', 'cache', 'profile')
 
     def __init__(self, **kwargs):
         Kernel.__init__(self, **kwargs)
-        self.engine = False
-        
+        self.connections = ConnectionPool(open_client)
+        self.jobs = JobManager()
+        self.pager = Pager()
+        self.search_cache = SearchCache()
+        self.insert_buffer = InsertBuffer()
+        self.insert_buffer.on_expire = self.report_expired
+        self.executing = False
+        self.scheduler = Scheduler()
+        # Client calls run on these threads for the kernel's lifetime, so each opens its gRPC channel only once.
+        self.rpc_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='milvus_kernel_rpc')
+        self.profiler = Profiler()
+        self.show_timing = False
+
+    @property
+    def connection(self):
+        """The connection a background job was submitted on, otherwise the current one."""
+        connection = bound.get()
+        return self.connections.get() if connection is None else connection
+
+    @property
+    def engine(self):
+        connection = bound.get()
+        return self.connections.engine if connection is None else connection.client
+
+    @property
+    def metadata(self):
+        return self.connection.metadata
+
     def output(self, output):
         if not self.silent:
-            display_content = {'source': 'kernel',
-                               'data': {'text/html': output},
-                               'metadata': {}}
-            self.send_response(self.iopub_socket, 'display_data', display_content)
-    
+            with timed('render'):
+                if isinstance(output, pd.DataFrame):
+                    output = self.pager.show(output)
+                display_content = {'source': 'kernel',
+                                   'data': output.bundle() if isinstance(output, Page) else {'text/html': output},
+                                   'metadata': {}}
+            with timed('send'):
+                self.send_response(self.iopub_socket, 'display_data', display_content)
+
+    def progress(self, text):
+        if not self.silent:
+            self.send_response(self.iopub_socket, 'stream', {'name':'stdout', 'text':text})
+
     def ok(self):
         return {'status':'ok', 'execution_count':self.execution_count, 'payload':[], 'user_expressions':{}}
 
@@ -39,246 +155,426 @@ class MilvusKernel(Kernel):
 
     def do_execute(self, code, silent, store_history=True, user_expressions=None, allow_stdin=False):
         self.silent = silent
-        message = 'Unable to connect to Milvus server. Check that the server is running.'
-        output = ''
+        self.executing = True
+        try:
+            return self.execute_cell(code)
+        finally:
+            self.executing = False
+            self.report_inserts()
+
+    def execute_cell(self, code):
         if not code.strip():
             return self.ok()
-        sql = code.rstrip()+('' if code.rstrip().endswith(";") else ';')
+        statements, plans, timings = split_statements(code), [], []
         try:
-            for v in sql.split(";"):
-                v = v.rstrip()
-                l = v.lower()
-                if len(l)>0:
-                    if l.startswith('milvus://'):
-                        self.engine = Milvus(uri=f'tcp://{v[9:]}')
-                    elif l=='help':
-                        output = pd.DataFrame(
-                            {'description':[
-                                'Create a collection',
-                                'Drop a collection',
-                                'Show all collections',
-                                'Create a partition',
-                                'Drop a partition',
-                                'Show all partitions in a collection',
-                                'Create an index',
-                                'Removes an index',
-                                'Flush data',
-                                'Compact all segments in a collection',
-                                'Search vectors',
-                                'Delete vectors by ID',
-                                'Insert a vector',
-                                'Select vector',
-                                'View metric type',
-                                'View index type',
-                                'View a collection description',
-                                'View a collection statistics',
-                            ],
-                             'milvus sql':[
-                                 "create table test01 where dimension=128 and index_file_size=1024 and metric_type='L2'",
-                                 'drop table test01',
-                                 'list table',
-                                 "create partition test01 where partition_tag='tag01'",
-                                 "drop partition test01 where partition_tag='tag01'",
-                                 'list partitions test01',
-                                 "create index test01 where index_type='FLAT' and nlist=4096",
-                                 'drop index test01',
-                                 'flush test01, test02',
-                                 'compact test01',
-                                 "select 2, 3, 5 from test01 where top_k=1 and partition_tags='tag01' and nprobe=16",
-                                 'delete test01 by id=1',
-                                 "insert 2,3,5 from test01 where partition_tag='tag01' by id=0",
-                                 'select test01 by id=1,2,3',
-                                 'help -metric',
-                                 'help -index',
-                                 'desc test01',
-                                 'stats test01',
-                             ]}).to_html()
-                    elif l=='help -metric':
-                        output = pd.DataFrame(
-                            {'description':[
-                                'HAMMING', 'INVALID', 'IP', 'JACCARD', 'L2', 'SUBSTRUCTURE', 'SUPERSTRUCTURE', 'TANIMOTO'
-                            ],
-                             'milvus MetricType':[
-                                 'MetricType.HAMMING', 'MetricType.INVALID', 'MetricType.IP', 'MetricType.JACCARD', 'MetricType.L2', 
-                                 'MetricType.SUBSTRUCTURE', 'MetricType.SUPERSTRUCTURE', 'MetricType.TANIMOTO'
-                             ]}).to_html()
-                    elif l=='help -index':
-                        output = pd.DataFrame(
-                            {'description':[
-                                'IVFLAT', 'ANNOY', 'FLAT', 'HNSW', 'INVALID', 'IVF_PQ', 'IVF_SQ8', 'IVF_SQ8H', 'RNSG'
-                            ],
-                             'milvus IndexType':[
-                                 'IndexType.IVFLAT', 'IndexType.ANNOY', 'IndexType.FLAT', 'IndexType.HNSW', 'IndexType.INVALID', 
-                                 'IndexType.IVF_PQ', 'IndexType.IVF_SQ8', 'IndexType.IVF_SQ8H', 'IndexType.RNSG'
-                             ]}).to_html()
-                    elif l.startswith('desc '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        info_col = self.engine.get_collection_info(v[4:].strip())[1]
-                        info_index = self.engine.get_index_info(v[4:].strip())[1]
-                        desc = (['collection_name', 'dimension', 'index_file_size', 'metric_type', 'index_type']
-                                +[i for i in info_index.params]+['row_count'])
-                        info = ([info_col.collection_name, info_col.dimension, info_col.index_file_size, str(info_col.metric_type),
-                                str(info_index.index_type)]+[info_index.params[i] for i in info_index.params]
-                                +[self.engine.get_collection_stats(v[4:].strip())[1]['row_count']])
-                        output = pd.DataFrame({'description': desc, 'info': info}).to_html()
-                    elif l.startswith('stats '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        temp = pd.DataFrame()
-                        for i in self.engine.get_collection_stats(v[5:].strip())[1]['partitions']:
-                            t = pd.DataFrame(i['segments'])
-                            t['tag'] = i['tag']
-                            temp = pd.concat([temp, t])
-                        output = temp.to_html()
-                    elif l.startswith('list table'):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = pd.DataFrame(self.engine.list_collections()[1], columns=['collections']).to_html()
-                    elif l.startswith('create table '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        param = {'collection_name':v.split(' where ')[0][12:].strip()}
-                        for i in v.split(' where ')[1].split(' and '):
-                            param_list = i.split('=')
-                            if param_list[0].strip()=='dimension':
-                                param['dimension'] = int(param_list[1].strip())
-                            elif param_list[0].strip()=='index_file_size':
-                                param['index_file_size'] = int(param_list[1].strip())
-                            elif param_list[0].strip()=='metric_type':
-                                metric_type_dict = {
-                                    'HAMMING': MetricType.HAMMING,
-                                    'INVALID': MetricType.INVALID,
-                                    'IP': MetricType.IP,
-                                    'JACCARD': MetricType.JACCARD,
-                                    'L2': MetricType.L2,
-                                    'SUBSTRUCTURE': MetricType.SUBSTRUCTURE,
-                                    'SUPERSTRUCTURE': MetricType.SUPERSTRUCTURE,
-                                    'TANIMOTO': MetricType.TANIMOTO}
-                                param['metric_type'] = metric_type_dict[param_list[1].strip().replace("'", '')]
-                        output = self.engine.create_collection(param).message
-                    elif l.startswith('drop table '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.drop_collection(collection_name=v[10:].strip()).message
-                    elif l.startswith('create partition '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.create_partition(collection_name=v.split(' where ')[0][16:].strip(),
-                                                              partition_tag=v.split(' where ')[1].split('=')[1].strip().replace("'", '')).message
-                    elif l.startswith('drop partition '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.drop_partition(collection_name=v.split(' where ')[0][14:].strip(),
-                                                            partition_tag=v.split(' where ')[1].split('=')[1].strip().replace("'", '')).message
-                    elif l.startswith('list partitions '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.list_partitions(collection_name=v[15:].strip())[1]
-                        output = pd.DataFrame([[i.collection_name, i.tag] for i in output], columns=['collections', 'tag']).to_html()
-                    elif l.startswith('create index '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        param = {}
-                        for i in v.split(' where ')[1].split(' and '):
-                            param_list = i.split('=')
-                            if param_list[0].strip()=='nlist':
-                                param['nlist'] = int(param_list[1].strip())
-                            elif param_list[0].strip()=='index_type':
-                                index_type_dict = {
-                                    'IVFLAT': IndexType.IVFLAT,
-                                    'ANNOY': IndexType.ANNOY,
-                                    'FLAT': IndexType.FLAT,
-                                    'HNSW': IndexType.HNSW,
-                                    'INVALID': IndexType.INVALID,
-                                    'IVF_PQ': IndexType.IVF_PQ,
-                                    'IVF_SQ8': IndexType.IVF_SQ8,
-                                    'IVF_SQ8H': IndexType.IVF_SQ8H,
-                                    'RNSG': IndexType.RNSG}
-                                param['index_type'] = index_type_dict[param_list[1].strip().replace("'", '')]
-                        output = self.engine.create_index(collection_name=v.split(' where ')[0][12:].strip(), params=param).message
-                    elif l.startswith('drop index '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.drop_index(collection_name=v[10:].strip()).message
-                    elif l.startswith('compact '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.compact(collection_name=v[7:].strip()).message
-                    elif l.startswith('flush '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        collection_list = [i.strip() for i in v[7:].strip().split(',') if len(i.strip())>0]
-                        output = self.engine.compact(collection_name_array=collection_list).message
-                    elif l.startswith('select ') and ' where ' in l:
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        partition_tags = None
-                        params = None
-                        for i in v.split(' where ')[1].split(' and '):
-                            param_list = i.split('=')
-                            if param_list[0].strip()=='top_k':
-                                top_k = int(param_list[1].strip())
-                            elif param_list[0].strip()=='partition_tags':
-                                partition_tags = [param_list[1].strip().replace("'", '')]
-                            elif param_list[0].strip()=='nprobe':
-                                params = {'nprobe': int(param_list[1].strip())}
-                        query_records = [float(i.strip()) for i in v.split(' from ')[0][6:].split(',') if len(i.strip())>0]
-                        output = self.engine.search(collection_name=v.split(' from ')[1].split(' where ')[0],
-                                                    top_k=top_k,
-                                                    query_records=query_records,
-                                                    partition_tags=partition_tags,
-                                                    params=params)
-                    elif l.startswith('delete '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        output = self.engine.delete_entity_by_id(collection_name=v.split(' by ')[0][6:].strip(),
-                                                                 id_array=[int(i.strip()) for i in v.split('=')[1].split(',') if len(i.strip())>0]).message
-                    elif l.startswith('insert '):
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        collection_name = v.split(' from ')[1].split(' ')[0].strip() if ' where ' in l or ' by ' in l else v.split(' from ')[1].strip()
-                        ids = None
-                        partition_tag = None
-                        if ' where ' in l:
-                            partition_tag = v.split(' where ')[1]
-                            if ' by ' in partition_tag:
-                                partition_tag = partition_tag.split(' by ')[0]
-                            partition_tag = partition_tag.split('=')[1].strip().replace("'", '')
-                        if ' by ' in l:
-                            ids = v.split(' by ')[1]
-                            if ' where ' in ids:
-                                ids = ids.split(' where ')[0]
-                            ids = int(ids.split('=')[1].strip())
-                        records = [float(i.strip()) for i in v.split(' from ')[0][6:].split(',') if len(i.strip())>0]
-                        _, output = self.engine.insert(collection_name=collection_name, records=records, ids=ids, partition_tag=partition_tag)
-                        output = pd.DataFrame(output, columns=['inserted_vector_ids']).to_html()
-                    elif l.startswith('select ') and ' by ' in l:
-                        if not self.engine:
-                            self.output(message)
-                            return self.ok()
-                        _, output = self.engine.get_entity_by_id(collection_name=v.split(' by ')[0][6:].strip(),
-                                                                 ids=[int(i.strip()) for i in v.split('=')[1].split(',') if len(i.strip())>0])
-                        output = pd.DataFrame(output, columns=['inserted_vector_ids']).to_html()
-                    else:
-                        output = 'Milvus SQL Syntax errors, please check SQL Syntax.'
-            self.output(output)
-            return self.ok()
-        except Exception as msg:
-            self.output(str(msg))
-            return self.err('Error executing code ' + sql)
+            for statement in statements:
+                start = time.perf_counter()
+                plans.append(parse(statement))
+                timings.append(StatementTiming(plans[-1], parse=time.perf_counter()-start))
+        except MilvusSQLSyntaxError as msg:
+            self.output(f'<pre>{html.escape(str(msg))}</pre>')
+            return self.err('Error executing code ' + code)
+        failed = False
+        for wave in waves(plans):
+            if failed:
+                for i in wave:
+                    self.output(self.statement_note(statements, i, 'skipped: an earlier statement failed'))
+                continue
+            futures = self.scheduler.start([plans[i] for i in wave], lambda n: self.run_statement(plans[wave[n]], timings[wave[n]]))
+            for i, future in zip(wave, futures):
+                try:
+                    output = future.result()
+                except Skipped as skipped:
+                    self.output(self.statement_note(statements, i, f'skipped: depends on failed statement {wave[skipped.failed]+1}'))
+                    continue
+                except Exception as msg:
+                    failed = True
+                    self.output(self.statement_note(statements, i, f'failed: {msg}') if len(statements)>1 else str(msg))
+                    continue
+                if not isinstance(output, str) or output:
+                    token = current.set(timings[i])
+                    try:
+                        self.output(output)
+                    finally:
+                        current.reset(token)
+                if plans[i].kind!='explain':
+                    self.profiler.record(timings[i])
+                if self.show_timing:
+                    self.progress(timings[i].footer())
+        return self.err('Error executing code ' + code) if failed else self.ok()
+
+    @staticmethod
+    def statement_note(statements, i, note):
+        """A line naming statement `i` of the cell by number and text; long statements are shortened in the middle."""
+        text = ' '.join(statements[i].split())
+        if len(text)>40:
+            text = text[:20].rstrip()+' ... '+text[-15:].lstrip()
+        return html.escape(f'statement {i+1} (`{text}`) {note}')
+
+    def run_statement(self, plan, timing):
+        if plan.kind not in self.offline and not self.engine:
+            return 'Unable to connect to Milvus server. Check that the server is running.'
+        token = current.set(timing)
+        try:
+            with timing.phase('execute'):
+                return self.execute(plan)
+        finally:
+            current.reset(token)
+
+    def execute(self, plan, connection=None):
+        """Run `plan`; with `connection` given it runs there rather than on whatever is current by then."""
+        token = bound.set(connection) if connection is not None else None
+        try:
+            if plan.kind in DRAINS:
+                for collection in plan.collections:
+                    self.insert_buffer.drain(collection_name=collection)
+            try:
+                return getattr(self, 'run_'+plan.kind)(plan)
+            finally:
+                if plan.kind in INVALIDATES and self.engine:
+                    for collection in plan.collections:
+                        self.metadata.invalidate(collection, INVALIDATES[plan.kind])
+                        self.search_cache.invalidate(self.connection.uri, collection)
+        finally:
+            if token is not None:
+                bound.reset(token)
+
+    def run_connect(self, plan):
+        if plan.args['name'] in self.connections.connections:
+            self.insert_buffer.drain(self.connections.get(plan.args['name']).uri)
+        self.connections.connect(plan.args['uri'], plan.args['name'])
+        return ''
+
+    def run_use(self, plan):
+        self.connections.use(plan.args['name'])
+        return ''
+
+    def run_disconnect(self, plan):
+        self.insert_buffer.drain(self.connections.get(plan.args['name']).uri)
+        self.connections.disconnect(plan.args['name'])
+        return ''
+
+    def run_list_connections(self, plan):
+        return self.connections.frame()
+
+    def run_more(self, plan):
+        return self.pager.more()
+
+    def run_page(self, plan):
+        return self.pager.page(plan.args['number'])
+
+    def run_set(self, plan):
+        if plan.args['option']=='page_size':
+            self.pager.page_size = plan.args['value']
+        elif plan.args['option']=='page_kb':
+            self.pager.max_bytes = plan.args['value']*1024
+        elif plan.args['option']=='metadata_ttl':
+            for connection in self.connections.connections.values():
+                connection.metadata.ttl = plan.args['value']
+        elif plan.args['option']=='timing':
+            self.show_timing = plan.args['value']
+        elif plan.args['option']=='search_cache':
+            if plan.args['value'] is not None:
+                self.search_cache.enabled = plan.args['value']
+            if not self.search_cache.enabled:
+                self.search_cache.clear()
+            if 'entries' in plan.args['params']:
+                self.search_cache.max_entries = plan.args['params']['entries']
+            if 'mb' in plan.args['params']:
+                self.search_cache.max_bytes = int(plan.args['params']['mb']*(1<<20))
+        elif plan.args['option']=='insert_buffer':
+            # Giving only the thresholds turns buffering on, as in `set insert_buffer rows=10000 ms=200`.
+            self.insert_buffer.enabled = plan.args['value'] is not False
+            if not self.insert_buffer.enabled:
+                self.insert_buffer.drain()
+            if 'rows' in plan.args['params']:
+                self.insert_buffer.drain()
+                self.insert_buffer.max_rows = plan.args['params']['rows']
+            if 'ms' in plan.args['params']:
+                self.insert_buffer.max_ms = plan.args['params']['ms']
+        return ''
+
+    def run_cache(self, plan):
+        if plan.args['action']=='clear':
+            self.search_cache.clear()
+        return self.search_cache.frame()
+
+    def run_profile(self, plan):
+        if plan.args['reset']:
+            self.profiler.reset()
+        return self.profiler.frame()
+
+    def run_explain(self, plan):
+        # The nested statement is parsed together with `explain analyze`, so it takes over that parse time;
+        # only its own sample goes to the profiler, the outer `explain` is not recorded.
+        outer = current.get()
+        timing = StatementTiming(plan.args['plan'], parse=outer.seconds['parse'] if outer is not None else 0.)
+        token = current.set(timing)
+        try:
+            with timing.phase('execute'):
+                output = self.execute(plan.args['plan'])
+            if isinstance(output, pd.DataFrame):
+                with timing.phase('render'):
+                    Page(output, 0, self.pager.page_size, self.pager.max_bytes).bundle()
+        finally:
+            current.reset(token)
+        self.profiler.record(timing)
+        ms = timing.breakdown()
+        return frame({'phase':list(ms), 'ms':[round(i, 3) for i in ms.values()]})
+
+    def run_help(self, plan):
+        if plan.args['topic']=='metric':
+            names = ['HAMMING', 'INVALID', 'IP', 'JACCARD', 'L2', 'SUBSTRUCTURE', 'SUPERSTRUCTURE', 'TANIMOTO']
+            return frame({'description':names, 'milvus MetricType':[f'MetricType.{i}' for i in names]})
+        if plan.args['topic']=='index':
+            names = ['IVFLAT', 'ANNOY', 'FLAT', 'HNSW', 'INVALID', 'IVF_PQ', 'IVF_SQ8', 'IVF_SQ8H', 'RNSG']
+            return frame({'description':names, 'milvus IndexType':[f'IndexType.{i}' for i in names]})
+        return frame(HELP, columns=['description', 'milvus sql'])
+
+    def run_desc(self, plan):
+        info_col = self.metadata.info(plan.collection)
+        info_index = self.metadata.index(plan.collection)
+        desc = (['collection_name', 'dimension', 'index_file_size', 'metric_type', 'index_type']
+                +[i for i in info_index.params]+['row_count'])
+        info = ([info_col.collection_name, info_col.dimension, info_col.index_file_size, str(info_col.metric_type),
+                str(info_index.index_type)]+[info_index.params[i] for i in info_index.params]
+                +[self.metadata.stats(plan.collection)['row_count']])
+        return frame({'description': desc, 'info': info})
+
+    def run_stats(self, plan):
+        collections = []
+        if plan.args['refresh']:
+            refetched = []
+            for collection in plan.collections:
+                status, count = self.engine.count_entities(collection)
+                index_type = self.metadata.index(collection).index_type
+                index_type = getattr(index_type, 'name', str(index_type))
+                # The row count misses segment merges; a pending index build is caught from the cached segments.
+                stats, changed = self.metadata.revalidate(collection, 'stats',
+                                                          lambda cached: status.OK() and cached['row_count']==count
+                                                          and not building(cached, index_type))
+                collections.append((collection, stats, self.metadata.info(collection).index_file_size))
+                if changed:
+                    refetched.append(collection)
+            self.progress(f"re-fetched stats of {', '.join(refetched) or 'no collection'}\n")
+        else:
+            collections = [(i, self.metadata.stats(i), self.metadata.info(i).index_file_size) for i in plan.collections]
+        return stats_frame(collections, segments=plan.args['segments'])
+
+    def run_list_tables(self, plan):
+        return frame(self.engine.list_collections()[1], columns=['collections'])
+
+    def run_list_partitions(self, plan):
+        return frame([[i.collection_name, i.tag] for i in self.metadata.partitions(plan.collection)], columns=['collections', 'tag'])
+
+    def run_create_table(self, plan):
+        param = {'collection_name':plan.collection}
+        param.update(plan.args)
+        if 'metric_type' in param:
+            param['metric_type'] = MetricType[param['metric_type']]
+        return self.engine.create_collection(param).message
+
+    def run_drop_table(self, plan):
+        return self.engine.drop_collection(collection_name=plan.collection).message
+
+    def run_create_partition(self, plan):
+        return self.engine.create_partition(collection_name=plan.collection, partition_tag=plan.args['partition_tag']).message
+
+    def run_drop_partition(self, plan):
+        return self.engine.drop_partition(collection_name=plan.collection, partition_tag=plan.args['partition_tag']).message
+
+    def run_create_index(self, plan):
+        params = {i:plan.args[i] for i in plan.args if i!='index_type'}
+        if 'efconstruction' in params:
+            params['efConstruction'] = params.pop('efconstruction')
+        return self.engine.create_index(collection_name=plan.collection, index_type=IndexType[plan.args['index_type']],
+                                        params=params).message
+
+    def run_drop_index(self, plan):
+        return self.engine.drop_index(collection_name=plan.collection).message
+
+    def run_compact(self, plan):
+        return self.engine.compact(collection_name=plan.collection).message
+
+    def run_flush(self, plan):
+        return self.engine.flush(collection_name_array=list(plan.collections)).message
+
+    def run_search(self, plan):
+        queries = plan.args['vectors'] if plan.args['path'] is None else open_vectors(plan.args['path'])
+        fanout = plan.args['connections'] is not None
+        connections = self.connections.resolve(plan.args['connections']) if fanout else [self.connection]
+        connections[0].metadata.check_dimension(plan.collection, queries)
+        if plan.args['into'] is not None:
+            return self.export_search(plan, queries, connections)
+        key = None
+        if self.search_cache.enabled:
+            key = SearchCache.key(tuple(i.uri for i in connections) if fanout else connections[0].uri, plan.collection,
+                                  plan.args['partition_tags'], plan.args['top_k'], plan.args['params'], queries)
+            output = self.search_cache.get(key)
+            if output is not None:
+                return result_frame(output)
+        if fanout:
+            metric = connections[0].metadata.info(plan.collection).metric_type
+            output = fanout_search({i.name:i.client for i in connections}, collection_name=plan.collection, queries=queries,
+                                   top_k=plan.args['top_k'], nq=plan.args['nq'],
+                                   partition_tags=plan.args['partition_tags'], params=plan.args['params'],
+                                   descending=getattr(metric, 'name', str(metric))=='IP', pool=self.rpc_pool)
+        else:
+            output = batched_search(self.engine, collection_name=plan.collection, queries=queries,
+                                    top_k=plan.args['top_k'], nq=plan.args['nq'],
+                                    partition_tags=plan.args['partition_tags'], params=plan.args['params'],
+                                    pool=self.rpc_pool)
+        if key is not None:
+            self.search_cache.put(key, output)
+        return result_frame(output)
+
+    def run_bench(self, plan):
+        queries = open_vectors(plan.args['queries'])
+        self.metadata.check_dimension(plan.collection, queries)
+        ground_truth = None
+        if plan.args['ground_truth'] is not None:
+            truth = load_ground_truth(plan.args['ground_truth'])
+            ground_truth = (np.arange(min(len(truth), len(queries))), truth[:len(queries)])
+        else:
+            info = self.metadata.info(plan.collection)
+            if plan.args['base'] is not None:
+                ids, base = None, open_vectors(plan.args['base'])
+            else:
+                self.progress(f'fetching {plan.collection} to compute exact neighbors\n')
+                ids, base = fetch_collection(self.engine, plan.collection, self.metadata.stats(plan.collection))
+            sample = np.random.default_rng(0).choice(len(queries), min(plan.args['sweep']['sample'], len(queries)), replace=False)
+            sample.sort()
+            truth = exact_neighbors(queries[sample], base, max(plan.args['sweep']['top_k']),
+                                    getattr(info.metric_type, 'name', str(info.metric_type)), ids)
+            ground_truth = (sample, truth)
+        return sweep(self.engine, plan.collection, queries, ground_truth, plan.args['sweep'], progress=self.progress)
+
+    def run_delete(self, plan):
+        return self.engine.delete_entity_by_id(collection_name=plan.collection, id_array=plan.args['ids'].tolist()).message
+
+    def run_insert(self, plan):
+        self.metadata.check_dimension(plan.collection, plan.args['vectors'])
+        if self.insert_buffer.enabled:
+            return self.buffered_insert(plan)
+        ids = None if plan.args['ids'] is None else plan.args['ids'].tolist()
+        status, output = self.engine.insert(collection_name=plan.collection, records=plan.args['vectors'],
+                                            ids=ids, partition_tag=plan.args['partition_tag'])
+        if not status.OK():
+            return status.message
+        return frame(output, columns=['inserted_vector_ids'])
+
+    def buffered_insert(self, plan):
+        ticket = self.insert_buffer.add(self.engine, self.connection.uri, plan.collection, plan.args['vectors'],
+                                        plan.args['ids'], plan.args['partition_tag'])
+        if ticket.error is not None:
+            ticket.reported = True
+            return ticket.error
+        if ticket.ids is not None:
+            ticket.reported = True
+            return frame(ticket.ids, columns=['inserted_vector_ids'])
+        return f'insert #{ticket.number}: {ticket.rows} vectors buffered for {plan.collection}, ids are reported when the batch is sent'
+
+    def report_expired(self):
+        # Between cells nothing else would print them, so they go under the last cell right away.
+        if not self.executing:
+            self.report_inserts()
+
+    def report_inserts(self):
+        """Print the ids of buffered inserts sent since the last report, or why they failed."""
+        for ticket in self.insert_buffer.completed():
+            if ticket.error is not None:
+                self.progress(f'insert #{ticket.number} into {ticket.collection_name} failed: {ticket.error}\n')
+            else:
+                self.progress(f'insert #{ticket.number} into {ticket.collection_name}: ids {ticket.ids.tolist()}\n')
+
+    def run_insert_file(self, plan):
+        vectors = open_vectors(plan.args['path'])
+        self.metadata.check_dimension(plan.collection, vectors)
+        inserted, seconds = pipeline_insert(self.engine, plan.collection, vectors,
+                                            ids=None if plan.args['ids_path'] is None else open_ids(plan.args['ids_path']),
+                                            partition_tag=plan.args['partition_tag'],
+                                            batch_size=plan.args['batch_size'], progress=self.rate_progress('inserted'))
+        return frame({'description':['collection_name', 'rows', 'seconds', 'rows_per_sec', 'first_id', 'last_id'],
+                             'info':[plan.collection, len(inserted), round(seconds, 3), round(len(inserted)/max(seconds, 1e-9)),
+                                     int(inserted[0]) if len(inserted) else None,
+                                     int(inserted[-1]) if len(inserted) else None]})
+
+    def rate_progress(self, verb, unit='rows'):
+        """A `progress(done, total, seconds)` callback that prints at most once a second."""
+        last = [0.]
+        def report(rows, total, seconds):
+            if seconds-last[0]>=1 or rows==total:
+                last[0] = seconds
+                self.progress(f'{verb} {rows}/{total} {unit} ({rows/max(total, 1):.1%}), {rows/max(seconds, 1e-9):,.0f} {unit}/sec\n')
+        return report
+
+    def run_get_by_id(self, plan):
+        if plan.args['into'] is not None:
+            return self.export_by_id(plan)
+        ids = plan.args['ids'].tolist()
+        status, output = self.engine.get_entity_by_id(collection_name=plan.collection, ids=ids)
+        if not status.OK():
+            return status.message
+        return frame({'id':ids, 'vector':output})
+
+    def export_by_id(self, plan):
+        info = self.metadata.info(plan.collection)
+        if getattr(info.metric_type, 'name', str(info.metric_type)) in BINARY_METRICS:
+            raise ValueError(f'Collection {plan.collection} holds binary vectors, which cannot be exported.')
+        ids = open_ids(plan.args['ids_path']) if plan.args['ids_path'] is not None else plan.args['ids']
+        rows, missing, seconds = export_entities(self.engine, plan.collection, info.dimension, plan.args['into'],
+                                                 ids=ids, id_range=plan.args['id_range'], chunk_size=plan.args['batch_size'],
+                                                 progress=self.rate_progress('scanned', 'ids'))
+        return frame({'description':['collection_name', 'path', 'rows', 'missing_ids', 'seconds', 'rows_per_sec'],
+                      'info':[plan.collection, plan.args['into'], rows, missing, round(seconds, 3),
+                              round(rows/max(seconds, 1e-9))]})
+
+    def export_search(self, plan, queries, connections):
+        args = plan.args
+        if args['connections'] is None:
+            parts = iter_search(self.engine, collection_name=plan.collection, queries=queries, top_k=args['top_k'],
+                                nq=args['nq'], partition_tags=args['partition_tags'], params=args['params'],
+                                pool=self.rpc_pool)
+        else:
+            metric = connections[0].metadata.info(plan.collection).metric_type
+            engines = {i.name:i.client for i in connections}
+            def merged():
+                for offset in range(0, len(queries), args['nq']):
+                    part = fanout_search(engines, collection_name=plan.collection, queries=queries[offset:offset+args['nq']],
+                                         top_k=args['top_k'], nq=args['nq'], partition_tags=args['partition_tags'],
+                                         params=args['params'], descending=getattr(metric, 'name', str(metric))=='IP',
+                                         pool=self.rpc_pool)
+                    part['query_idx'] += offset
+                    yield part
+            parts = merged()
+        rows, seconds = export_results(parts, args['into'], len(queries)*args['top_k'], shard=args['connections'] is not None)
+        return frame({'description':['collection_name', 'path', 'queries', 'rows', 'seconds'],
+                      'info':[plan.collection, args['into'], len(queries), rows, round(seconds, 3)]})
+
+    def do_shutdown(self, restart):
+        self.insert_buffer.drain()
+        self.connections.close()
+        return Kernel.do_shutdown(self, restart)
+
+    def run_background(self, plan):
+        inner = plan.args['plan']
+        connection = self.connection
+        progress = None
+        if inner.kind=='create_index':
+            progress = lambda: index_progress(connection.client, inner.collection)
+        job = self.jobs.submit(plan.args['statement'], lambda: self.execute(inner, connection), progress)
+        return self.jobs.frame([job])
+
+    def run_jobs(self, plan):
+        return self.jobs.frame()
+
+    def run_wait(self, plan):
+        job = self.jobs.wait(plan.args['job_id'], timeout=plan.args['timeout'])
+        if job.status=='done':
+            return job.future.result()
+        if job.status=='failed':
+            raise job.future.exception()
+        return self.jobs.frame([job])
+
+    def run_cancel(self, plan):
+        return self.jobs.frame([self.jobs.cancel(plan.args['job_id'])])
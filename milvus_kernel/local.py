@@ -0,0 +1,565 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+from functools import wraps
+
+import numpy as np
+
+
+DEFAULT_TAG = '_default'
+
+# Milvus naming rules for collections; the name is also the collection's directory.
+_COLLECTION_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]{0,254}')
+
+
+class Status:
+    SUCCESS = 0
+    UNEXPECTED_ERROR = 1
+    COLLECTION_NOT_EXISTS = 4
+    ILLEGAL_ARGUMENT = 5
+    ILLEGAL_DIMENSION = 7
+    ILLEGAL_COLLECTION_NAME = 9
+
+    def __init__(self, code=SUCCESS, message='Success'):
+        self.code = code
+        self.message = message
+
+    def OK(self):
+        return self.code==Status.SUCCESS
+
+    def __repr__(self):
+        return f'Status(code={self.code}, message={self.message!r})'
+
+
+class LocalError(Exception):
+    def __init__(self, message, code=Status.ILLEGAL_ARGUMENT):
+        super().__init__(message)
+        self.code = code
+
+
+class CollectionSchema:
+    def __init__(self, collection_name, dimension, index_file_size, metric_type):
+        self.collection_name = collection_name
+        self.dimension = dimension
+        self.index_file_size = index_file_size
+        self.metric_type = metric_type
+
+
+class IndexParam:
+    def __init__(self, collection_name, index_type, params):
+        self.collection_name = collection_name
+        self.index_type = index_type
+        self.params = params
+
+
+class PartitionParam:
+    def __init__(self, collection_name, tag):
+        self.collection_name = collection_name
+        self.tag = tag
+
+
+class SearchResult:
+    def __init__(self, id_array, distance_array):
+        self.id_array = id_array
+        self.distance_array = distance_array
+
+
+def _name(value):
+    return getattr(value, 'name', str(value)).upper()
+
+
+def _status(*default):
+    """Report failures as a non-OK Status the way the Milvus client does, instead of raising."""
+    def decorator(fn):
+        @wraps(fn)
+        def inner(self, *args, **kwargs):
+            try:
+                with self.lock:
+                    return fn(self, *args, **kwargs)
+            except LocalError as e:
+                status = Status(e.code, str(e))
+            except Exception as e:
+                status = Status(Status.UNEXPECTED_ERROR, str(e))
+            return (status,)+default if default else status
+        return inner
+    return decorator
+
+
+class Segment:
+    """The vectors of one partition: growable memory-mapped float32 rows plus their int64 ids."""
+    def __init__(self, path, dimension, rows=0):
+        self.path = path
+        self.dimension = dimension
+        self.rows = rows
+        self.vectors = self.ids = self.lists = None
+        self._sorted = None
+        self._open(max(rows, 1024))
+
+    @property
+    def lists(self):
+        """IVF list of every row, or None without an IVF index."""
+        return self._lists
+
+    @lists.setter
+    def lists(self, lists):
+        self._lists = lists
+        self._inverted = None
+
+    def inverted(self, nlist):
+        """Rows grouped by IVF list: row positions ordered by list, and where each list starts in them."""
+        if self._inverted is None:
+            order = np.argsort(self._lists, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self._lists, minlength=nlist))])
+            self._inverted = (order, offsets)
+        return self._inverted
+
+    def _open(self, capacity):
+        for suffix, dtype, width in (('.vectors', 'float32', self.dimension), ('.ids', 'int64', 1)):
+            nbytes = capacity*width*np.dtype(dtype).itemsize
+            with open(self.path+suffix, 'ab') as f:
+                if f.tell()<nbytes:
+                    f.truncate(nbytes)
+        capacity = os.path.getsize(self.path+'.ids')//8
+        self.vectors = np.memmap(self.path+'.vectors', dtype='float32', mode='r+', shape=(capacity, self.dimension))
+        self.ids = np.memmap(self.path+'.ids', dtype='int64', mode='r+', shape=(capacity,))
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+    def append(self, vectors, ids):
+        if self.rows+len(vectors)>self.capacity:
+            self.vectors.flush()
+            self.ids.flush()
+            self._open(max(self.rows+len(vectors), self.capacity*2))
+        self.vectors[self.rows:self.rows+len(vectors)] = vectors
+        self.ids[self.rows:self.rows+len(vectors)] = ids
+        self.rows += len(vectors)
+        self._sorted = None
+
+    def live(self):
+        """Row positions that have not been deleted."""
+        return np.flatnonzero(self.ids[:self.rows]>=0)
+
+    def locate(self, ids):
+        """Row of every id in `ids`, or -1 when it is not in this segment."""
+        if self._sorted is None:
+            order = np.argsort(self.ids[:self.rows], kind='stable')
+            self._sorted = (order, np.asarray(self.ids[:self.rows])[order])
+        order, sorted_ids = self._sorted
+        if len(sorted_ids)==0:
+            return np.full(len(ids), -1, dtype='int64')
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids)-1)
+        return np.where(sorted_ids[pos]==ids, order[pos], -1)
+
+    def delete(self, ids):
+        rows = self.locate(ids)
+        rows = rows[rows>=0]
+        self.ids[rows] = -1
+        self._sorted = None
+        return len(rows)
+
+    def compact(self):
+        live = self.live()
+        if len(live)<self.rows:
+            self.vectors[:len(live)] = self.vectors[live]
+            self.ids[:len(live)] = self.ids[live]
+            if self.lists is not None:
+                self.lists = self.lists[live]
+            self.rows = len(live)
+            self._sorted = None
+
+    def flush(self):
+        self.vectors.flush()
+        self.ids.flush()
+
+    def remove(self):
+        self.vectors = self.ids = None
+        for suffix in ('.vectors', '.ids'):
+            if os.path.exists(self.path+suffix):
+                os.remove(self.path+suffix)
+
+
+class Collection:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        # Directories written before segment files were numbered used the tag as the file name.
+        meta.setdefault('files', {tag:tag for tag in meta['partitions']})
+        meta.setdefault('next_file', 0)
+        self.segments = {}
+        for tag in meta['partitions']:
+            self.add_segment(tag, meta['rows'].get(tag, 0))
+        self.centroids = None
+        if meta['index']['index_type'].startswith('IVF') and os.path.exists(os.path.join(path, 'centroids.npy')):
+            self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+            for segment in self.segments.values():
+                segment.lists = self.assign(segment.vectors[:segment.rows])
+
+    @property
+    def metric(self):
+        return self.meta['metric_type']
+
+    def add_segment(self, tag, rows=0):
+        """Open the segment of partition `tag`; its files are numbered, so the tag never becomes part of a path."""
+        if tag not in self.meta['files']:
+            self.meta['files'][tag] = f"segment_{self.meta['next_file']}"
+            self.meta['next_file'] += 1
+        self.segments[tag] = Segment(os.path.join(self.path, self.meta['files'][tag]), self.meta['dimension'], rows)
+        return self.segments[tag]
+
+    def save(self):
+        for segment in self.segments.values():
+            segment.flush()
+        self.save_meta()
+
+    def save_meta(self):
+        """Write row counts and settings; the rows themselves reach the files through the memory maps."""
+        self.meta['rows'] = {tag:segment.rows for tag, segment in self.segments.items()}
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+    def scores(self, queries, vectors):
+        """Smaller is better: squared L2 distance, or the negated inner product for IP."""
+        if self.metric=='IP':
+            return -(queries@vectors.T)
+        return (queries**2).sum(1)[:, None]-2*(queries@vectors.T)+(vectors**2).sum(1)[None, :]
+
+    def assign(self, vectors, centroids=None, scores=None):
+        """Nearest centroid of every vector, in chunks that keep the score matrix around 64 MB."""
+        centroids = self.centroids if centroids is None else centroids
+        scores = self.scores if scores is None else scores
+        lists = np.empty(len(vectors), dtype='int32')
+        chunk = max(1, (1<<24)//len(centroids))
+        for offset in range(0, len(vectors), chunk):
+            lists[offset:offset+chunk] = np.argmin(scores(np.asarray(vectors[offset:offset+chunk]), centroids), axis=1)
+        return lists
+
+    def train(self, nlist, iterations=10, sample=256):
+        """Lloyd's k-means on a sample of the collection, fully vectorized per iteration."""
+        data = np.vstack([segment.vectors[segment.live()] for segment in self.segments.values()] or
+                         [np.empty((0, self.meta['dimension']), 'float32')])
+        if len(data)==0:
+            raise LocalError('Cannot build an IVF index on an empty collection.')
+        nlist = min(nlist, len(data))
+        rng = np.random.default_rng(0)
+        if len(data)>nlist*sample:
+            data = data[rng.choice(len(data), nlist*sample, replace=False)]
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self.assign(data, centroids, lambda a, b: (a**2).sum(1)[:, None]-2*a@b.T+(b**2).sum(1)[None, :])
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts>0
+            order = np.argsort(labels, kind='stable')
+            sums = np.add.reduceat(data[order], (np.cumsum(counts)-counts)[filled], axis=0)
+            centroids[filled] = sums/counts[filled, None]
+        self.centroids = centroids.astype('float32')
+        np.save(os.path.join(self.path, 'centroids.npy'), self.centroids)
+        for segment in self.segments.values():
+            segment.lists = self.assign(segment.vectors[:segment.rows])
+
+    def search(self, queries, top_k, tags, nprobe):
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        segments = [self.segments[tag] for tag in tags]
+        if self.centroids is None:
+            # FLAT: one matrix product per segment covers every query at once.
+            rows = [(segment, segment.live()) for segment in segments]
+            score = np.hstack([self.scores(queries, segment.vectors[live]) for segment, live in rows] or [np.empty((len(queries), 0))])
+            found = np.concatenate([segment.ids[live] for segment, live in rows] or [np.empty(0, 'int64')])
+            return self._top(score, found, top_k)
+        return self._search_ivf(queries, top_k, segments, max(1, min(nprobe, len(self.centroids))))
+
+    def _search_ivf(self, queries, top_k, segments, nprobe):
+        """Visit each probed list once, scoring it against all the queries that probe it in one matrix product."""
+        nlist = len(self.centroids)
+        probes = np.argpartition(self.scores(queries, self.centroids), nprobe-1, axis=1)[:, :nprobe] if nprobe<nlist \
+            else np.broadcast_to(np.arange(nlist), (len(queries), nlist))
+        lists = probes.reshape(-1)
+        order = np.argsort(lists, kind='stable')
+        lists, probing = lists[order], np.repeat(np.arange(len(queries)), nprobe)[order]
+        starts = np.flatnonzero(np.r_[True, lists[1:]!=lists[:-1]])
+        ends = np.r_[starts[1:], len(lists)]
+        best = np.full((len(queries), top_k), np.inf, dtype='float32')
+        best_ids = np.full((len(queries), top_k), -1, dtype='int64')
+        for segment in segments:
+            rows_by_list, offsets = segment.inverted(nlist)
+            for start, end in zip(starts, ends):
+                rows = rows_by_list[offsets[lists[start]]:offsets[lists[start]+1]]
+                ids = segment.ids[rows]
+                rows, ids = rows[ids>=0], ids[ids>=0]
+                if len(rows)==0:
+                    continue
+                q = probing[start:end]
+                score = np.hstack([best[q], self.scores(queries[q], segment.vectors[rows])])
+                found = np.hstack([best_ids[q], np.broadcast_to(ids, (len(q), len(ids)))])
+                keep = np.argpartition(score, top_k-1, axis=1)[:, :top_k]
+                best[q] = np.take_along_axis(score, keep, 1)
+                best_ids[q] = np.take_along_axis(found, keep, 1)
+        ranked = np.argsort(best, axis=1)
+        best, best_ids = np.take_along_axis(best, ranked, 1), np.take_along_axis(best_ids, ranked, 1)
+        if self.metric=='IP':
+            best = -best
+        hits = (best_ids>=0).sum(1)
+        return ([row[:n] for row, n in zip(best_ids.tolist(), hits)],
+                [row[:n] for row, n in zip(best.tolist(), hits)])
+
+    def _top(self, score, found, top_k):
+        k = min(top_k, score.shape[1])
+        if k==0:
+            return [[] for _ in range(len(score))], [[] for _ in range(len(score))]
+        keep = np.argpartition(score, k-1, axis=1)[:, :k]
+        keep = np.take_along_axis(keep, np.argsort(np.take_along_axis(score, keep, 1), axis=1), 1)
+        best = np.take_along_axis(score, keep, 1)
+        if self.metric=='IP':
+            best = -best
+        return found[keep].tolist(), best.astype('float32').tolist()
+
+
+class LocalMilvus:
+    """An in-process stand-in for `milvus.Milvus` backed by memory-mapped files.
+
+    It implements the client calls the kernel makes, with brute-force FLAT search for L2 and IP
+    and a k-means IVF index searched with `nprobe`. `path` keeps the collections between sessions;
+    without it they live in a temporary directory removed on close.
+    """
+    def __init__(self, path=None):
+        self.temporary = path is None
+        self.path = tempfile.mkdtemp(prefix='milvus_local_') if path is None else os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.lock = threading.RLock()
+        self.collections = {}
+        for name in sorted(os.listdir(self.path)):
+            meta = os.path.join(self.path, name, 'meta.json')
+            if os.path.exists(meta):
+                with open(meta) as f:
+                    self.collections[name] = Collection(os.path.join(self.path, name), json.load(f))
+
+    def _get(self, collection_name):
+        if collection_name not in self.collections:
+            raise LocalError(f'Collection {collection_name} does not exist', Status.COLLECTION_NOT_EXISTS)
+        return self.collections[collection_name]
+
+    def _tag(self, collection, partition_tag):
+        tag = partition_tag or DEFAULT_TAG
+        if tag not in collection.segments:
+            raise LocalError(f'Partition {tag} does not exist')
+        return tag
+
+    @_status(None)
+    def server_status(self, timeout=None):
+        return Status(), 'OK'
+
+    def close(self):
+        with self.lock:
+            for collection in self.collections.values():
+                collection.save()
+            if self.temporary:
+                self.collections = {}
+                shutil.rmtree(self.path, ignore_errors=True)
+
+    @_status()
+    def create_collection(self, param, timeout=None):
+        name = param['collection_name']
+        if not isinstance(name, str) or not _COLLECTION_NAME.fullmatch(name):
+            raise LocalError(f'Invalid collection name {name!r}: use letters, digits and underscores, '
+                             'not starting with a digit', Status.ILLEGAL_COLLECTION_NAME)
+        if name in self.collections:
+            raise LocalError(f'Collection {name} already exists')
+        if int(param['dimension'])<=0:
+            raise LocalError('Dimension must be positive', Status.ILLEGAL_DIMENSION)
+        metric = _name(param.get('metric_type', 'L2'))
+        if metric not in ('L2', 'IP'):
+            raise LocalError(f'The local engine supports L2 and IP metrics, got {metric}')
+        path = os.path.join(self.path, name)
+        os.makedirs(path)
+        meta = {'dimension':int(param['dimension']), 'index_file_size':int(param.get('index_file_size', 1024)),
+                'metric_type':metric, 'index':{'index_type':'FLAT', 'params':{}},
+                'partitions':[DEFAULT_TAG], 'files':{}, 'next_file':0, 'rows':{}, 'next_id':0}
+        self.collections[name] = Collection(path, meta)
+        self.collections[name].save()
+        return Status(message='Create collection successfully!')
+
+    @_status(False)
+    def has_collection(self, collection_name, timeout=None):
+        return Status(), collection_name in self.collections
+
+    @_status()
+    def drop_collection(self, collection_name, timeout=None):
+        self._get(collection_name)
+        collection = self.collections.pop(collection_name)
+        for segment in collection.segments.values():
+            segment.remove()
+        shutil.rmtree(collection.path, ignore_errors=True)
+        return Status(message='Delete collection successfully!')
+
+    @_status([])
+    def list_collections(self, timeout=None):
+        return Status(), sorted(self.collections)
+
+    @_status(None)
+    def get_collection_info(self, collection_name, timeout=None):
+        meta = self._get(collection_name).meta
+        return Status(), CollectionSchema(collection_name, meta['dimension'], meta['index_file_size'], meta['metric_type'])
+
+    @_status(0)
+    def count_entities(self, collection_name, timeout=None):
+        return Status(), sum(len(i.live()) for i in self._get(collection_name).segments.values())
+
+    @_status(None)
+    def get_collection_stats(self, collection_name, timeout=None):
+        collection = self._get(collection_name)
+        index_name = 'IDMAP' if collection.centroids is None else collection.meta['index']['index_type']
+        partitions = []
+        for tag, segment in collection.segments.items():
+            live = len(segment.live())
+            segments = [] if segment.rows==0 else [{'name':tag, 'row_count':live, 'deleted_count':segment.rows-live,
+                                                     'index_name':index_name,
+                                                     'data_size':segment.rows*(collection.meta['dimension']*4+8)}]
+            partitions.append({'tag':tag, 'row_count':live, 'segments':segments})
+        return Status(), {'row_count':sum(i['row_count'] for i in partitions), 'partitions':partitions}
+
+    @_status()
+    def create_partition(self, collection_name, partition_tag, timeout=None):
+        collection = self._get(collection_name)
+        if not isinstance(partition_tag, str) or not partition_tag.strip() or len(partition_tag)>255:
+            raise LocalError(f'Invalid partition tag {partition_tag!r}')
+        if partition_tag in collection.segments:
+            raise LocalError(f'Partition {partition_tag} already exists')
+        collection.meta['partitions'].append(partition_tag)
+        collection.add_segment(partition_tag)
+        if collection.centroids is not None:
+            collection.segments[partition_tag].lists = np.empty(0, dtype='int32')
+        collection.save()
+        return Status(message='Create partition successfully!')
+
+    @_status(False)
+    def has_partition(self, collection_name, partition_tag, timeout=None):
+        return Status(), partition_tag in self._get(collection_name).segments
+
+    @_status([])
+    def list_partitions(self, collection_name, timeout=None):
+        return Status(), [PartitionParam(collection_name, tag) for tag in self._get(collection_name).segments]
+
+    @_status()
+    def drop_partition(self, collection_name, partition_tag, timeout=None):
+        collection = self._get(collection_name)
+        if partition_tag==DEFAULT_TAG:
+            raise LocalError('The default partition cannot be dropped')
+        self._tag(collection, partition_tag)
+        collection.segments.pop(partition_tag).remove()
+        collection.meta['partitions'].remove(partition_tag)
+        del collection.meta['files'][partition_tag]
+        collection.save()
+        return Status(message='Drop partition successfully!')
+
+    @_status([])
+    def insert(self, collection_name, records, ids=None, partition_tag=None, params=None, timeout=None, **kwargs):
+        collection = self._get(collection_name)
+        segment = collection.segments[self._tag(collection, partition_tag)]
+        vectors = np.asarray(records, dtype='float32')
+        if vectors.ndim!=2 or vectors.shape[1]!=collection.meta['dimension']:
+            raise LocalError(f"Vectors must have dimension {collection.meta['dimension']}", Status.ILLEGAL_DIMENSION)
+        if ids is None:
+            ids = np.arange(collection.meta['next_id'], collection.meta['next_id']+len(vectors), dtype='int64')
+        else:
+            ids = np.asarray(ids, dtype='int64')
+            if len(ids)!=len(vectors):
+                raise LocalError('The number of ids does not match the number of vectors')
+        collection.meta['next_id'] = max(collection.meta['next_id'], int(ids.max())+1 if len(ids) else 0)
+        segment.append(vectors, ids)
+        if collection.centroids is not None:
+            segment.lists = np.concatenate([segment.lists, collection.assign(vectors)])
+        collection.save_meta()
+        return Status(message='Add vectors successfully!'), ids.tolist()
+
+    @_status([])
+    def get_entity_by_id(self, collection_name, ids, timeout=None, partition_tag=None):
+        collection = self._get(collection_name)
+        ids = np.asarray(ids, dtype='int64')
+        vectors = [[] for _ in range(len(ids))]
+        for tag, segment in collection.segments.items():
+            if partition_tag is not None and tag!=partition_tag:
+                continue
+            rows = segment.locate(ids)
+            for i in np.flatnonzero(rows>=0):
+                vectors[i] = segment.vectors[rows[i]].tolist()
+        return Status(message='Obtain vector successfully'), vectors
+
+    @_status([])
+    def list_id_in_segment(self, collection_name, segment_name, timeout=None):
+        collection = self._get(collection_name)
+        segment = collection.segments[self._tag(collection, segment_name)]
+        return Status(), segment.ids[segment.live()].tolist()
+
+    @_status()
+    def delete_entity_by_id(self, collection_name, id_array, timeout=None, partition_tag=None):
+        collection = self._get(collection_name)
+        ids = np.asarray(id_array, dtype='int64')
+        for tag, segment in collection.segments.items():
+            if partition_tag is None or tag==partition_tag:
+                segment.delete(ids)
+        return Status(message='Delete vectors successfully!')
+
+    @_status(None)
+    def search(self, collection_name, top_k, query_records, partition_tags=None, params=None, timeout=None, **kwargs):
+        collection = self._get(collection_name)
+        queries = np.asarray(query_records, dtype='float32')
+        if queries.ndim!=2 or queries.shape[1]!=collection.meta['dimension']:
+            raise LocalError(f"Query vectors must have dimension {collection.meta['dimension']}", Status.ILLEGAL_DIMENSION)
+        tags = [self._tag(collection, tag) for tag in partition_tags] if partition_tags else list(collection.segments)
+        nprobe = (params or {}).get('nprobe', collection.meta['index']['params'].get('nprobe', 16))
+        ids, distances = collection.search(queries, top_k, tags, nprobe)
+        return Status(message='Search vectors successfully!'), SearchResult(ids, distances)
+
+    @_status()
+    def flush(self, collection_name_array=None, timeout=None, **kwargs):
+        for name in collection_name_array or list(self.collections):
+            self._get(name).save()
+        return Status(message='Flush successfully!')
+
+    @_status()
+    def compact(self, collection_name, timeout=None, **kwargs):
+        collection = self._get(collection_name)
+        for segment in collection.segments.values():
+            segment.compact()
+        collection.save()
+        return Status(message='Compact successfully!')
+
+    @_status()
+    def create_index(self, collection_name, index_type=None, params=None, timeout=None, **kwargs):
+        collection = self._get(collection_name)
+        index_type = 'FLAT' if index_type is None else _name(index_type)
+        if index_type=='IVFLAT':
+            index_type = 'IVF_FLAT'
+        params = dict(params or {})
+        if index_type.startswith('IVF'):
+            # Every IVF variant is served by the same k-means inverted lists over raw float32 vectors.
+            params.setdefault('nlist', 16384)
+            collection.train(int(params['nlist']))
+        elif index_type=='FLAT':
+            collection.centroids = None
+        else:
+            raise LocalError(f'The local engine supports FLAT and IVF indexes, got {index_type}')
+        collection.meta['index'] = {'index_type':index_type, 'params':params}
+        collection.save()
+        return Status(message='Build index successfully!')
+
+    @_status(None)
+    def get_index_info(self, collection_name, timeout=None):
+        index = self._get(collection_name).meta['index']
+        return Status(), IndexParam(collection_name, index['index_type'], dict(index['params']))
+
+    @_status()
+    def drop_index(self, collection_name, timeout=None):
+        collection = self._get(collection_name)
+        collection.centroids = None
+        for segment in collection.segments.values():
+            segment.lists = None
+        if os.path.exists(os.path.join(collection.path, 'centroids.npy')):
+            os.remove(os.path.join(collection.path, 'centroids.npy'))
+        collection.meta['index'] = {'index_type':'FLAT', 'params':{}}
+        collection.save()
+        return Status(message='Drop index successfully!')
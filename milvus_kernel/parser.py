@@ -0,0 +1,534 @@
+import re
+from functools import lru_cache
+from collections import namedtuple
+
+import numpy as np
+
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+   |(?P<string>'[^']*'|"[^"]*")
+   |(?P<numbers>{0}(?:\s*,\s*{0})*)
+   |(?P<name>[A-Za-z_]\w*)
+   |(?P<option>-[A-Za-z_]\w*)
+   |(?P<op>[\[\],=*])
+""".format(_NUMBER), re.X)
+_CONNECT = re.compile(r'milvus://(\S+?)(?:\s+as\s+([A-Za-z_]\w*))?$', re.I)
+_QUOTED = re.compile(r"""('[^']*'|"[^"]*")|\s+""")
+
+METRIC_TYPES = ('HAMMING', 'INVALID', 'IP', 'JACCARD', 'L2', 'SUBSTRUCTURE', 'SUPERSTRUCTURE', 'TANIMOTO')
+INDEX_TYPES = ('IVFLAT', 'IVF_FLAT', 'ANNOY', 'FLAT', 'HNSW', 'INVALID', 'IVF_PQ', 'IVF_SQ8', 'IVF_SQ8H', 'RNSG')
+
+# Parameter kind for partition tags: a quoted string, a bare name or a number, kept as the text written.
+TAG = 'tag'
+
+
+class MilvusSQLSyntaxError(ValueError):
+    def __init__(self, message, text, pos):
+        self.text = text
+        self.pos = pos
+        super().__init__(f'Milvus SQL Syntax error at position {pos}: {message}\n    {text}\n    {" "*pos}^')
+
+
+class Token(namedtuple('Token', ['kind', 'text', 'pos'])):
+    __slots__ = ()
+
+    @property
+    def lower(self):
+        return self.text.lower()
+
+
+class Plan(namedtuple('Plan', ['kind', 'collections', 'args'])):
+    """A parsed statement: `kind` selects the executor, `args` holds its typed arguments."""
+    __slots__ = ()
+
+    @property
+    def collection(self):
+        return self.collections[0] if self.collections else None
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos<len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise MilvusSQLSyntaxError(f'unexpected character {text[pos]!r}', text, pos)
+        if m.lastgroup!='ws':
+            tokens.append(Token(m.lastgroup, m.group(), pos))
+        pos = m.end()
+    tokens.append(Token('end', '', len(text)))
+    return tokens
+
+
+def split_statements(code):
+    """Split a cell on ';', ignoring semicolons inside quoted strings."""
+    statements = []
+    start = 0
+    quote = None
+    for i, c in enumerate(code):
+        if quote:
+            if c==quote:
+                quote = None
+        elif c in '\'"':
+            quote = c
+        elif c==';':
+            statements.append(code[start:i])
+            start = i+1
+    statements.append(code[start:])
+    return [i.strip() for i in statements if i.strip()]
+
+
+def normalize(statement):
+    """Collapse whitespace outside quoted strings so equivalent statements share a cache entry."""
+    return _QUOTED.sub(lambda m: m.group(1) or ' ', statement.strip())
+
+
+def parse(statement):
+    return _parse(normalize(statement))
+
+
+@lru_cache(maxsize=512)
+def _parse(text):
+    m = _CONNECT.match(text)
+    if m is not None:
+        return Plan('connect', (), {'uri':m.group(1), 'name':m.group(2) or 'default'})
+    if text.lower().startswith('milvus://'):
+        raise MilvusSQLSyntaxError("expected 'milvus://host:port [as name]'", text, text.find(' '))
+    return _Parser(text).statement()
+
+
+def _number(text):
+    return float(text) if any(i in text for i in '.eE') else int(text)
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.i = 0
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.i+offset, len(self.tokens)-1)]
+
+    def next(self):
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def error(self, message, token=None):
+        token = token or self.peek()
+        return MilvusSQLSyntaxError(message, self.text, token.pos)
+
+    def describe(self, token):
+        return 'end of statement' if token.kind=='end' else repr(token.text)
+
+    def at(self, *words):
+        token = self.peek()
+        return token.kind=='name' and token.lower in words
+
+    def accept(self, word):
+        if self.at(word):
+            return self.next()
+
+    def expect(self, *words):
+        if not self.at(*words):
+            raise self.error(f"expected {' or '.join(repr(i) for i in words)}, got {self.describe(self.peek())}")
+        return self.next().lower
+
+    def expect_op(self, op):
+        if self.peek().text!=op:
+            raise self.error(f'expected {op!r}, got {self.describe(self.peek())}')
+        return self.next()
+
+    def name(self, what='collection name'):
+        if self.peek().kind!='name':
+            raise self.error(f'expected {what}, got {self.describe(self.peek())}')
+        return self.next().text
+
+    def names(self, what='collection name'):
+        names = [self.name(what)]
+        while self.peek().text==',':
+            self.next()
+            names.append(self.name(what))
+        return tuple(names)
+
+    def string(self, what='quoted string'):
+        if self.peek().kind!='string':
+            raise self.error(f'expected {what}, got {self.describe(self.peek())}')
+        return self.next().text[1:-1]
+
+    def numbers(self, what='number'):
+        token = self.peek()
+        if token.kind!='numbers':
+            raise self.error(f'expected {what}, got {self.describe(token)}')
+        self.next()
+        return token
+
+    def ints(self, what='id list'):
+        token = self.numbers(what)
+        try:
+            return np.array(token.text.split(','), dtype='int64')
+        except ValueError:
+            raise self.error(f'expected integer {what}', token)
+
+    def integer(self, what='integer'):
+        token = self.numbers(what)
+        if not re.fullmatch(r'[-+]?\d+', token.text):
+            raise self.error(f'expected a single integer {what}', token)
+        return int(token.text)
+
+    def into(self, required=False, batch_size=True):
+        """`into 'out.npy'|'out.parquet' [batch_size=N]` for results written to a file instead of shown."""
+        args = {'into':None, 'batch_size':10000} if batch_size else {'into':None}
+        if required and not self.at('into'):
+            raise self.error(f"expected 'into', got {self.describe(self.peek())}")
+        if self.accept('into'):
+            token = self.peek()
+            args['into'] = self.string('output file path')
+            if not args['into'].lower().endswith(('.npy', '.parquet')):
+                raise self.error('expected a .npy or .parquet output file', token)
+            if batch_size and self.at('batch_size'):
+                token = self.peek(2)
+                args['batch_size'] = self.assignment({'batch_size':int})[1]
+                if args['batch_size']<=0:
+                    raise self.error('batch_size must be positive', token)
+        return args
+
+    def vectors(self):
+        """A single `1,2,3` row or a list of bracketed `[1,2,3], [4,5,6]` rows, parsed in bulk to float32."""
+        if self.peek().text!='[':
+            rows = [self.numbers('vector')]
+        else:
+            rows = []
+            while True:
+                self.expect_op('[')
+                rows.append(self.numbers('vector'))
+                self.expect_op(']')
+                if self.peek().text!=',' or self.peek(1).text!='[':
+                    break
+                self.next()
+        dim = rows[0].text.count(',')+1
+        for row in rows:
+            if row.text.count(',')+1!=dim:
+                raise self.error(f'vector has {row.text.count(",")+1} elements, expected {dim}', row)
+        vectors = np.array(','.join(i.text for i in rows).split(','), dtype='float32').reshape(len(rows), dim)
+        vectors.flags.writeable = False
+        return vectors
+
+    def value(self):
+        token = self.next()
+        if token.kind=='string':
+            values = [token.text[1:-1]]
+            while self.peek().text==',' and self.peek(1).kind=='string':
+                self.next()
+                values.append(self.next().text[1:-1])
+            return values[0] if len(values)==1 else tuple(values)
+        if token.kind=='name':
+            return token.text
+        if token.kind=='numbers':
+            values = tuple(_number(i.strip()) for i in token.text.split(','))
+            return values[0] if len(values)==1 else values
+        raise self.error(f'expected a value, got {self.describe(token)}', token)
+
+    def assignment(self, allowed, positive=()):
+        """`name=value`, where `allowed` maps each name to a type, a tuple of choices, TAG, or None for anything;
+        names in `positive` must be given a value above 0."""
+        key = self.peek()
+        if key.kind!='name':
+            raise self.error(f'expected parameter name, got {self.describe(key)}')
+        if key.lower not in allowed:
+            raise self.error(f"unknown parameter {key.text!r}, expected one of {', '.join(allowed)}")
+        self.next()
+        self.expect_op('=')
+        token = self.peek()
+        value = self.value()
+        kind = allowed[key.lower]
+        if isinstance(kind, tuple):
+            if str(value).upper() not in kind:
+                raise self.error(f"unknown {key.lower} {value!r}, expected one of {', '.join(kind)}", token)
+            value = str(value).upper()
+        elif kind==TAG:
+            if isinstance(value, tuple):
+                raise self.error(f'expected a single {key.lower}', token)
+            value = token.text if token.kind=='numbers' else value
+        elif kind is not None and not isinstance(value, (int, float) if kind is float else kind):
+            raise self.error(f'invalid value for {key.lower}, expected {kind.__name__}', token)
+        if key.lower in positive and value<=0:
+            raise self.error(f'{key.lower} must be positive', token)
+        return key.lower, value
+
+    def where(self, allowed, required=(), positive=()):
+        """`where k=v and k=v ...`; a bare `where` directly followed by `by` is accepted too."""
+        params = {}
+        if required and not self.at('where'):
+            raise self.error(f"expected 'where', got {self.describe(self.peek())}")
+        where = self.accept('where')
+        if where and not self.at('by'):
+            while True:
+                key, value = self.assignment(allowed, positive)
+                params[key] = value
+                if not self.accept('and'):
+                    break
+        for key in required:
+            if key not in params:
+                raise self.error(f'missing required parameter {key!r}', where)
+        return params
+
+    def end(self):
+        if self.peek().kind!='end':
+            raise self.error(f'unexpected {self.describe(self.peek())}')
+
+    def statement(self):
+        token = self.peek()
+        if token.kind!='name' or not hasattr(self, 'parse_'+token.lower):
+            raise self.error(f'unknown statement {self.describe(token)}')
+        self.next()
+        plan = getattr(self, 'parse_'+token.lower)()
+        self.end()
+        return plan
+
+    def job_id(self):
+        token = self.numbers('job id')
+        if not token.text.isdigit():
+            raise self.error('expected a single job id', token)
+        return int(token.text)
+
+    def nested(self, excluded, what):
+        """The rest of the text as a statement of its own, for prefixes such as `background`."""
+        statement = self.text[self.peek().pos:]
+        plan = _Parser(statement).statement() if statement else None
+        if plan is None or plan.kind in excluded:
+            raise self.error(f'expected a statement to {what}')
+        self.i = len(self.tokens)-1
+        return plan, statement
+
+    def parse_background(self):
+        plan, statement = self.nested(('connect', 'help', 'background', 'jobs', 'wait', 'cancel', 'explain'), 'run in the background')
+        return Plan('background', plan.collections, {'plan':plan, 'statement':statement})
+
+    def parse_explain(self):
+        self.expect('analyze')
+        plan, statement = self.nested(('connect', 'background', 'explain'), 'analyze')
+        return Plan('explain', plan.collections, {'plan':plan, 'statement':statement})
+
+    def parse_bench(self):
+        collection = self.name()
+        self.expect('with')
+        self.expect('queries')
+        self.expect('from')
+        args = {'queries':self.string('query file path'), 'ground_truth':None, 'base':None}
+        while self.at('ground_truth', 'base'):
+            key = self.next().lower
+            self.expect('from')
+            args[key] = self.string(f'{key} file path')
+        sweep = {'nprobe':(None,), 'top_k':(10,), 'concurrency':(1,), 'nq':1, 'sample':1000}
+        if self.accept('sweep'):
+            while self.peek().kind=='name':
+                self.accept('and')
+                token = self.peek(2)
+                key, value = self.assignment({'nprobe':None, 'top_k':None, 'concurrency':None, 'nq':int, 'sample':int})
+                values = value if isinstance(value, tuple) else (value,)
+                if not all(isinstance(i, int) and i>0 for i in values):
+                    raise self.error(f'{key} must be positive integers', token)
+                sweep[key] = values if key in ('nprobe', 'top_k', 'concurrency') else value
+        args['sweep'] = sweep
+        return Plan('bench', (collection,), args)
+
+    def parse_profile(self):
+        return Plan('profile', (), {'reset':bool(self.accept('reset'))})
+
+    def parse_jobs(self):
+        return Plan('jobs', (), {})
+
+    def parse_wait(self):
+        job_id = self.job_id()
+        return Plan('wait', (), dict({'job_id':job_id, 'timeout':None}, **self.where({'timeout':float})))
+
+    def parse_cancel(self):
+        return Plan('cancel', (), {'job_id':self.job_id()})
+
+    def parse_more(self):
+        return Plan('more', (), {})
+
+    def parse_page(self):
+        token = self.numbers('page number')
+        if not token.text.isdigit():
+            raise self.error('expected a single page number', token)
+        return Plan('page', (), {'number':int(token.text)})
+
+    def parse_set(self):
+        """`set name=value` for scalar settings, `set name on|off [k=v ...]` for features."""
+        if self.peek(1).text=='=':
+            token = self.peek(2)
+            option, value = self.assignment({'page_size':int, 'page_kb':int, 'metadata_ttl':float})
+            if value<(0 if option=='metadata_ttl' else 1):
+                raise self.error(f'{option} must be positive', token)
+            return Plan('set', (), {'option':option, 'value':value, 'params':{}})
+        options = {'search_cache':{'entries':int, 'mb':float}, 'insert_buffer':{'rows':int, 'ms':float}, 'timing':{}}
+        token = self.peek()
+        option = self.name('setting name').lower()
+        if option not in options:
+            raise self.error(f"unknown setting {token.text!r}, expected one of page_size, page_kb, metadata_ttl, {', '.join(options)}", token)
+        value = None
+        if self.at('on', 'off'):
+            value = self.next().lower=='on'
+        params = {}
+        while self.peek().kind=='name':
+            self.accept('and')
+            token = self.peek(2)
+            key, number = self.assignment(options[option])
+            if number<=0:
+                raise self.error(f'{key} must be positive', token)
+            params[key] = number
+        if value is None and not params:
+            raise self.error(f"expected 'on', 'off' or {option} parameters")
+        return Plan('set', (), {'option':option, 'value':value, 'params':params})
+
+    def parse_cache(self):
+        return Plan('cache', (), {'action':self.expect('stats', 'clear')})
+
+    def parse_help(self):
+        topic = self.peek()
+        if topic.kind=='option':
+            if topic.lower not in ('-metric', '-index'):
+                raise self.error(f"unknown help topic {topic.text!r}, expected '-metric' or '-index'")
+            self.next()
+            return Plan('help', (), {'topic':topic.lower[1:]})
+        return Plan('help', (), {'topic':None})
+
+    def parse_desc(self):
+        return Plan('desc', (self.name(),), {})
+
+    def parse_stats(self):
+        collections = self.names()
+        args = {'segments':False, 'refresh':False}
+        while self.at('segments', 'refresh'):
+            args[self.next().lower] = True
+        return Plan('stats', collections, args)
+
+    def parse_use(self):
+        return Plan('use', (), {'name':self.name('connection name')})
+
+    def parse_disconnect(self):
+        return Plan('disconnect', (), {'name':self.name('connection name')})
+
+    def parse_list(self):
+        what = self.expect('table', 'tables', 'partitions', 'connections')
+        if what=='connections':
+            return Plan('list_connections', (), {})
+        if what=='partitions':
+            return Plan('list_partitions', (self.name(),), {})
+        return Plan('list_tables', (), {})
+
+    def parse_create(self):
+        what = self.expect('table', 'partition', 'index')
+        collection = self.name()
+        if what=='table':
+            params = self.where({'dimension':int, 'index_file_size':int, 'metric_type':METRIC_TYPES}, required=('dimension',))
+            return Plan('create_table', (collection,), params)
+        if what=='partition':
+            return Plan('create_partition', (collection,), self.where({'partition_tag':TAG}, required=('partition_tag',)))
+        params = self.where({'index_type':INDEX_TYPES, 'nlist':int, 'm':int, 'nbits':int, 'efconstruction':int,
+                             'n_trees':int, 'search_length':int, 'out_degree':int, 'candidate_pool_size':int, 'knng':int},
+                            required=('index_type',))
+        return Plan('create_index', (collection,), params)
+
+    def parse_drop(self):
+        what = self.expect('table', 'partition', 'index')
+        collection = self.name()
+        if what=='partition':
+            return Plan('drop_partition', (collection,), self.where({'partition_tag':TAG}, required=('partition_tag',)))
+        return Plan('drop_'+what, (collection,), {})
+
+    def parse_compact(self):
+        return Plan('compact', (self.name(),), {})
+
+    def parse_flush(self):
+        return Plan('flush', self.names(), {})
+
+    def parse_delete(self):
+        collection = self.name()
+        self.expect('by')
+        self.expect('id')
+        self.expect_op('=')
+        return Plan('delete', (collection,), {'ids':self.ints()})
+
+    def parse_insert(self):
+        if self.accept('from'):
+            path = self.string('vector file path')
+            self.expect('into')
+            collection = self.name()
+            args = {'path':path, 'ids_path':None, 'partition_tag':None, 'batch_size':10000}
+            args.update(self.where({'partition_tag':TAG, 'batch_size':int}, positive=('batch_size',)))
+            while self.at('by', 'batch_size', 'and'):
+                if self.accept('by'):
+                    self.expect('ids')
+                    self.expect('from')
+                    args['ids_path'] = self.string('id file path')
+                else:
+                    self.accept('and')
+                    args['batch_size'] = self.assignment({'batch_size':int}, positive=('batch_size',))[1]
+            return Plan('insert_file', (collection,), args)
+        vectors = self.vectors()
+        self.expect('from')
+        collection = self.name()
+        args = {'vectors':vectors, 'ids':None, 'partition_tag':None}
+        args.update(self.where({'partition_tag':TAG}))
+        if self.accept('by'):
+            self.expect('id')
+            self.expect_op('=')
+            token = self.peek()
+            args['ids'] = self.ints()
+            if len(args['ids'])!=len(vectors):
+                raise self.error(f"got {len(args['ids'])} ids for {len(vectors)} vectors", token)
+        if self.at('where') and args['partition_tag'] is None:
+            args.update(self.where({'partition_tag':TAG}))
+        return Plan('insert', (collection,), args)
+
+    def parse_select(self):
+        if self.peek().kind=='name' and self.peek(1).lower=='by':
+            collection = self.name()
+            self.expect('by')
+            args = {'ids':None, 'ids_path':None, 'id_range':None}
+            if self.accept('ids'):
+                self.expect('from')
+                args['ids_path'] = self.string('id file path')
+            else:
+                self.expect('id')
+                if self.accept('between'):
+                    low = self.integer('id')
+                    self.expect('and')
+                    token = self.peek()
+                    high = self.integer('id')
+                    if high<low:
+                        raise self.error(f'empty id range {low} to {high}', token)
+                    args['id_range'] = (low, high)
+                else:
+                    self.expect_op('=')
+                    args['ids'] = self.ints()
+            args.update(self.into(required=args['ids'] is None))
+            return Plan('get_by_id', (collection,), args)
+        if self.peek().kind=='string':
+            args = {'path':self.string(), 'vectors':None}
+        else:
+            args = {'path':None, 'vectors':self.vectors()}
+        self.expect('from')
+        collection = self.name()
+        args['connections'] = None
+        if self.accept('on'):
+            if self.peek().text=='*':
+                self.next()
+                args['connections'] = ('*',)
+            else:
+                args['connections'] = self.names('connection name')
+        params = self.where({'top_k':int, 'nprobe':int, 'partition_tags':None, 'nq':int}, required=('top_k',),
+                            positive=('top_k', 'nq'))
+        tags = params.pop('partition_tags', None)
+        args['partition_tags'] = None if tags is None else [str(i) for i in (tags if isinstance(tags, tuple) else (tags,))]
+        args['top_k'] = params.pop('top_k')
+        args['nq'] = params.pop('nq', 1024)
+        args['params'] = params or None
+        args['into'] = self.into(batch_size=False)['into']
+        return Plan('search', (collection,), args)
@@ -0,0 +1,112 @@
+import json
+import html
+
+import numpy as np
+
+
+# Largest mime bundle sent for one page; vectors are shortened, then rows dropped, to stay under it.
+MAX_PAGE_BYTES = 512*1024
+
+# Vectors longer than this are shown as their first values once a page is over budget.
+VECTOR_PREVIEW = 8
+
+
+def shorten(value):
+    if isinstance(value, (list, tuple, np.ndarray)) and len(value)>VECTOR_PREVIEW:
+        head = ', '.join(f'{float(i):.4g}' for i in value[:VECTOR_PREVIEW])
+        return f'[{head}, ...] ({len(value)} values)'
+    return value
+
+
+def shorten_vectors(rows):
+    """`rows` with every long list or array cell replaced by a short text preview."""
+    columns = [i for i in rows.columns if rows[i].dtype==object]
+    if not columns:
+        return rows, False
+    short = rows.copy()
+    for column in columns:
+        short[column] = short[column].map(shorten)
+    return short, any(not short[i].equals(rows[i]) for i in columns)
+
+
+class Page:
+    def __init__(self, frame, number, page_size, max_bytes=MAX_PAGE_BYTES):
+        self.frame = frame
+        self.number = number
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.frame)//self.page_size))
+
+    def encode(self, rows):
+        """Plain text and JSON of `rows`, and their size in bytes."""
+        text, payload = rows.to_string(), rows.to_json(orient='split')
+        return text, payload, len(text.encode())+len(payload.encode())
+
+    def bundle(self):
+        """Mime bundle for one page: only these rows are rendered, and the bundle stays under `max_bytes`.
+
+        An oversized page first gets its vectors shortened, then loses rows from the end; HTML is only
+        added when it still fits.
+        """
+        start = self.number*self.page_size
+        rows = self.frame.iloc[start:start+self.page_size]
+        text, payload, size = self.encode(rows)
+        shortened = False
+        if size>self.max_bytes:
+            rows, shortened = shorten_vectors(rows)
+            text, payload, size = self.encode(rows)
+        page_rows = len(rows)
+        while size>self.max_bytes and len(rows)>1:
+            rows = rows.iloc[:max(1, min(len(rows)-1, len(rows)*self.max_bytes//size))]
+            text, payload, size = self.encode(rows)
+        notes = []
+        if self.pages>1 or len(rows)<page_rows:
+            notes.append(f'rows {start+1}-{start+len(rows)} of {len(self.frame)}, page {self.number+1}/{self.pages}')
+        if shortened:
+            notes.append(f'vectors shortened to {VECTOR_PREVIEW} values')
+        if len(rows)<page_rows:
+            notes.append(f'{page_rows-len(rows)} rows of this page left out to stay under page_kb={self.max_bytes//1024}')
+        if self.pages>1:
+            notes.append("use 'more' or 'page n' to see other rows")
+        footer = '; '.join(notes)
+        data = {'text/plain': text+(f'\n{footer}' if footer else ''),
+                'application/json': {'total_rows':len(self.frame), 'page':self.number+1, 'pages':self.pages,
+                                     'page_size':self.page_size, 'shown_rows':len(rows), 'shortened':shortened,
+                                     **json.loads(payload)}}
+        table = rows.to_html()+(f'<p>{html.escape(footer)}</p>' if footer else '')
+        if size+len(table.encode())<=self.max_bytes:
+            data['text/html'] = table
+        return data
+
+
+class Pager:
+    """Keeps the last full result in the kernel and hands it out one page at a time."""
+    def __init__(self, page_size=50, max_bytes=MAX_PAGE_BYTES):
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+        self.frame = None
+        self.number = 0
+
+    def show(self, frame):
+        self.frame = frame
+        self.number = 0
+        return Page(frame, 0, self.page_size, self.max_bytes)
+
+    def page(self, number):
+        if self.frame is None:
+            raise ValueError('There is no result to page through.')
+        pages = max(1, -(-len(self.frame)//self.page_size))
+        if not 1<=number<=pages:
+            raise ValueError(f'Page {number} is out of range, the result has {pages} pages.')
+        self.number = number-1
+        return Page(self.frame, self.number, self.page_size, self.max_bytes)
+
+    def more(self):
+        if self.frame is None:
+            raise ValueError('There is no result to page through.')
+        if (self.number+1)*self.page_size>=len(self.frame):
+            raise ValueError('No more rows.')
+        return self.page(self.number+2)
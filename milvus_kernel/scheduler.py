@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from .timing import submit
+
+
+# Statements that only read, so any number of them can run at once.
+READS = ('search', 'get_by_id', 'desc', 'stats', 'list_tables', 'list_partitions', 'list_connections', 'help')
+
+# Statements that read or change kernel state (the current connection, settings, the last result, jobs),
+# and `bench`, whose timings must not share the server with anything else in the cell;
+# everything before them finishes first and nothing after them starts until they are done.
+BARRIERS = ('connect', 'use', 'disconnect', 'set', 'more', 'page', 'cache', 'profile',
+            'background', 'jobs', 'wait', 'cancel', 'bench')
+
+
+class Skipped(Exception):
+    """Raised for a statement that was not run because one it depends on failed; `failed` is that statement's index."""
+    def __init__(self, failed):
+        Exception.__init__(self, failed)
+        self.failed = failed
+
+
+def footprint(plan):
+    """(writes, collections) of a statement; '*' stands for every collection."""
+    if plan.kind=='explain':
+        return footprint(plan.args['plan'])
+    collections = set(plan.collections)
+    if not collections and (plan.kind=='list_tables' or plan.kind not in READS):
+        collections = {'*'}
+    return plan.kind not in READS, collections
+
+
+def conflicts(a, b):
+    """Whether two statements must keep their order: one of them writes a collection the other touches."""
+    (a_writes, a_collections), (b_writes, b_collections) = a, b
+    if not (a_writes or b_writes) or not (a_collections and b_collections):
+        return False
+    return bool(a_collections&b_collections) or '*' in a_collections or '*' in b_collections
+
+
+def waves(plans):
+    """Split a cell into runs of statements that may overlap, with every barrier on its own."""
+    wave = []
+    for i, plan in enumerate(plans):
+        if plan.kind in BARRIERS:
+            if wave:
+                yield wave
+            yield [i]
+            wave = []
+        else:
+            wave.append(i)
+    if wave:
+        yield wave
+
+
+class Scheduler:
+    """Runs the statements of one wave on a bounded pool, each as soon as the earlier ones it conflicts with are done."""
+    def __init__(self, max_workers=8):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='milvus_kernel')
+
+    def start(self, plans, fn):
+        """Start `fn(i)` for every plan and return one future per plan, in source order."""
+        if len(plans)==1:
+            future = Future()
+            try:
+                future.set_result(fn(0))
+            except Exception as e:
+                future.set_exception(e)
+            return [future]
+        marks = [footprint(i) for i in plans]
+        futures = []
+        for i in range(len(plans)):
+            after = [(j, futures[j]) for j in range(i) if conflicts(marks[j], marks[i])]
+            futures.append(submit(self.pool, self._after, after, fn, i))
+        return futures
+
+    @staticmethod
+    def _after(after, fn, i):
+        # Futures are queued in source order, so everything waited on here has already been picked up by a worker.
+        for j, future in after:
+            error = future.exception()
+            if error is not None:
+                raise Skipped(error.failed if isinstance(error, Skipped) else j)
+        return fn(i)
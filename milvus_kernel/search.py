@@ -0,0 +1,118 @@
+import heapq
+from itertools import chain, islice, repeat
+from concurrent.futures import Future
+
+import numpy as np
+
+from .timing import submit, frame
+
+
+def result_arrays(id_array, distance_array, offset=0):
+    """Flatten the client's ragged top_k lists into (query_idx, rank, id, distance) columns."""
+    lengths = np.fromiter(map(len, id_array), dtype='int64', count=len(id_array))
+    total = int(lengths.sum())
+    ids = np.fromiter(chain.from_iterable(id_array), dtype='int64', count=total)
+    distance = np.fromiter(chain.from_iterable(distance_array), dtype='float32', count=total)
+    query_idx = np.repeat(np.arange(offset, offset+len(lengths)), lengths)
+    rank = np.arange(total)-np.repeat(np.cumsum(lengths)-lengths, lengths)
+    return {'query_idx':query_idx, 'rank':rank, 'id':ids, 'distance':distance}
+
+
+def concat_arrays(parts):
+    if not parts:
+        return {'query_idx':np.empty(0, 'int64'), 'rank':np.empty(0, 'int64'),
+                'id':np.empty(0, 'int64'), 'distance':np.empty(0, 'float32')}
+    return {i:np.concatenate([p[i] for p in parts]) for i in parts[0]}
+
+
+def start_search(pool, engine, collection_name, queries, offset, nq, top_k, partition_tags=None, params=None):
+    """Start the search of the nq-sized batch at `offset` on `pool`; without a pool it runs right here."""
+    records = np.ascontiguousarray(queries[offset:offset+nq], dtype='float32')
+    kwargs = {'collection_name':collection_name, 'top_k':top_k, 'query_records':records,
+              'partition_tags':partition_tags, 'params':params}
+    if pool is not None:
+        return submit(pool, engine.search, **kwargs)
+    future = Future()
+    try:
+        future.set_result(engine.search(**kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def iter_search(engine, collection_name, queries, top_k, nq=1024, partition_tags=None, params=None, pool=None):
+    """Search `queries` in nq-sized batches and yield each batch's result arrays.
+
+    With more than one batch and a long-lived `pool`, the next batch is already in flight while
+    the previous result is assembled and consumed; a single batch is searched inline.
+    """
+    pool = pool if len(queries)>nq else None
+    pending = None
+    for offset in range(0, len(queries), nq):
+        future = start_search(pool, engine, collection_name, queries, offset, nq, top_k, partition_tags, params)
+        if pending is not None:
+            yield collect_result(*pending)
+        pending = (future, offset)
+    if pending is not None:
+        yield collect_result(*pending)
+
+
+def collect_result(future, offset):
+    status, result = future.result()
+    if not status.OK():
+        raise Exception(status.message)
+    return result_arrays(result.id_array, result.distance_array, offset)
+
+
+def batched_search(engine, collection_name, queries, top_k, nq=1024, partition_tags=None, params=None, pool=None):
+    """Search `queries` in nq-sized batches, keeping one RPC in flight while the last result is assembled."""
+    return concat_arrays(list(iter_search(engine, collection_name, queries, top_k, nq, partition_tags, params, pool)))
+
+
+def merge_topk(parts, nq, top_k, descending=False):
+    """Merge per-shard results into one global top_k per query.
+
+    `parts` maps a shard name to its result arrays. Each shard's hits for a query are
+    already ordered by distance, so a heap merge only has to look at the first top_k.
+    """
+    bounds = {i:np.searchsorted(parts[i]['query_idx'], np.arange(nq+1)) for i in parts}
+    query_idx, rank, ids, distance, shards = [], [], [], [], []
+    for q in range(nq):
+        lists = [zip(parts[i]['distance'][bounds[i][q]:bounds[i][q+1]].tolist(),
+                     parts[i]['id'][bounds[i][q]:bounds[i][q+1]].tolist(), repeat(i)) for i in parts]
+        merged = list(islice(heapq.merge(*lists, key=lambda x: x[0], reverse=descending), top_k))
+        query_idx.extend(repeat(q, len(merged)))
+        rank.extend(range(len(merged)))
+        for d, i, shard in merged:
+            distance.append(d)
+            ids.append(i)
+            shards.append(shard)
+    return {'query_idx':np.array(query_idx, dtype='int64'), 'rank':np.array(rank, dtype='int64'),
+            'id':np.array(ids, dtype='int64'), 'distance':np.array(distance, dtype='float32'),
+            'shard':np.array(shards, dtype=object)}
+
+
+def fanout_search(engines, collection_name, queries, top_k, nq=1024, partition_tags=None, params=None, descending=False,
+                  pool=None):
+    """Run the same search on every engine in `engines` ({name: client}) and merge the hits.
+
+    Each batch goes to all engines at once on `pool`, with the next batch sent before the last one is collected.
+    """
+    parts = {i:[] for i in engines}
+    pending = None
+    for offset in range(0, len(queries), nq):
+        futures = {i:start_search(pool, engines[i], collection_name, queries, offset, nq, top_k, partition_tags, params)
+                   for i in engines}
+        if pending is not None:
+            for i, future in pending[0].items():
+                parts[i].append(collect_result(future, pending[1]))
+        pending = (futures, offset)
+    if pending is not None:
+        for i, future in pending[0].items():
+            parts[i].append(collect_result(future, pending[1]))
+    return merge_topk({i:concat_arrays(parts[i]) for i in parts}, len(queries), top_k, descending)
+
+
+def result_frame(arrays):
+    columns = ['query_idx', 'rank', 'id', 'distance']
+    return frame(arrays, columns=columns+(['shard'] if 'shard' in arrays else []))
@@ -0,0 +1,117 @@
+import numpy as np
+
+from .timing import frame
+
+
+# Recommend `compact` once this share of a collection's stored rows are deleted.
+COMPACT_DELETED_RATIO = 0.1
+
+# Segments under this share of `index_file_size` count as small; Milvus 1.x reports sizes but not deleted rows,
+# so a collection with this many small segments gets a `compact` recommendation too.
+SMALL_SEGMENT_RATIO = 0.5
+COMPACT_SMALL_SEGMENTS = 100
+
+UNINDEXED = ('IDMAP', 'FLAT', '')
+
+
+def segment_columns(collection_name, stats):
+    """Every segment of `get_collection_stats` as columns, in one pass over the nested dict.
+
+    `deleted_count` is NaN unless the server reports it for the segment.
+    """
+    tags, names, rows, deleted, index_names, sizes = [], [], [], [], [], []
+    for partition in stats.get('partitions', []):
+        for segment in partition.get('segments') or []:
+            tags.append(partition['tag'])
+            names.append(segment.get('name'))
+            rows.append(segment.get('row_count', 0))
+            deleted.append(segment.get('deleted_count', np.nan))
+            index_names.append(segment.get('index_name', ''))
+            sizes.append(segment.get('data_size', 0))
+    return {'collection':np.full(len(names), collection_name, dtype=object), 'tag':np.array(tags, dtype=object),
+            'name':np.array(names, dtype=object), 'row_count':np.array(rows, dtype='int64'),
+            'deleted_count':np.array(deleted, dtype='float64'), 'index_name':np.array(index_names, dtype=object),
+            'data_size':np.array(sizes, dtype='int64')}
+
+
+def _group_sizes(group, sizes, groups):
+    """min, median and max of `sizes` within each group, from one lexsort; NaN for empty groups."""
+    ordered = sizes[np.lexsort((sizes, group))].astype('float64')
+    counts = np.bincount(group, minlength=groups)
+    ends = np.cumsum(counts)
+    starts = ends-counts
+    filled = counts>0
+
+    def at(positions):
+        values = np.full(groups, np.nan)
+        values[filled] = ordered[positions[filled]]
+        return values
+
+    return at(starts), (at(starts+(counts-1)//2)+at(starts+counts//2))/2, at(ends-1)
+
+
+def aggregate(collection_name, stats, columns, index_file_size=None):
+    """One row per partition plus a collection total: rows, segments, small segments, segment size spread,
+    deleted share and whether `compact` is worth running.
+
+    `index_file_size` is the collection's setting in MB; without it no segment counts as small.
+    """
+    tags = [i['tag'] for i in stats.get('partitions', [])]
+    # Group 0 is the whole collection, groups 1.. are the partitions in server order.
+    lookup = {tag:i+1 for i, tag in enumerate(tags)}
+    group = np.fromiter((lookup[i] for i in columns['tag']), dtype='int64', count=len(columns['tag']))
+    group = np.concatenate([np.zeros(len(group), dtype='int64'), group])
+    sizes = np.tile(columns['data_size'], 2)
+    rows = np.tile(columns['row_count'], 2)
+    deleted = np.tile(columns['deleted_count'], 2)
+    indexed = np.tile(~np.isin(columns['index_name'], UNINDEXED), 2)
+    groups = len(tags)+1
+    segments = np.bincount(group, minlength=groups)
+    limit = index_file_size*SMALL_SEGMENT_RATIO*(1<<20) if index_file_size else 0
+    small = np.bincount(group, sizes<limit, minlength=groups).astype('int64')
+    smallest, median, largest = _group_sizes(group, sizes, groups)
+    known = ~np.isnan(deleted)
+    deleted_rows = np.bincount(group, np.where(known, deleted, 0), minlength=groups)
+    reported = np.bincount(group, known, minlength=groups)==segments
+    stored = np.bincount(group, rows, minlength=groups)+deleted_rows
+    ratio = np.where(reported&(stored>0), deleted_rows/np.maximum(stored, 1), np.nan)
+    ratio[segments==0] = 0.
+    row_count = [stats.get('row_count', 0)]+[i.get('row_count', 0) for i in stats.get('partitions', [])]
+    deleted_note = 'deleted rows are not reported' if np.isnan(ratio[0]) else f'{ratio[0]:.1%} of stored rows are deleted'
+    small_note = (f'{small[0]} of {segments[0]} segments are under {SMALL_SEGMENT_RATIO:g} x index_file_size'
+                  if index_file_size else 'index_file_size is unknown')
+    if not np.isnan(ratio[0]) and ratio[0]>=COMPACT_DELETED_RATIO:
+        compact = True
+    elif small[0]>=COMPACT_SMALL_SEGMENTS:
+        compact = True
+    elif np.isnan(ratio[0]) and not index_file_size:
+        compact = None
+    else:
+        compact = False
+    reason = f'{deleted_note}; {small_note}'
+    mb = 1/(1<<20)
+    return {'collection':[collection_name]*groups, 'tag':['*']+tags, 'row_count':row_count,
+            'segments':segments, 'small_segments':small, 'indexed_segments':np.bincount(group, indexed, minlength=groups).astype('int64'),
+            'data_mb':np.round(np.bincount(group, sizes, minlength=groups)*mb, 3),
+            'min_segment_mb':np.round(smallest*mb, 3), 'median_segment_mb':np.round(median*mb, 3),
+            'max_segment_mb':np.round(largest*mb, 3), 'deleted_ratio':np.round(ratio, 4),
+            'compact':[compact]+[None]*len(tags), 'reason':[reason]+['']*len(tags)}
+
+
+def stats_frame(collections, segments=False):
+    """`collections` is a list of (name, stats, index_file_size); build the segment or the aggregate table
+    for all of them at once."""
+    parts = [segment_columns(name, stats) for name, stats, _ in collections]
+    if not segments:
+        parts = [aggregate(name, stats, part, size) for (name, stats, size), part in zip(collections, parts)]
+    columns = {i:np.concatenate([np.asarray(p[i], dtype=object if i in ('compact', 'reason') else None) for p in parts])
+               for i in parts[0]}
+    return frame(columns)
+
+
+def building(stats, index_type):
+    """Whether the collection has an index that some of its segments in `stats` don't carry yet."""
+    if index_type.upper() in UNINDEXED+('INVALID',):
+        return False
+    return any(segment.get('index_name', '') in UNINDEXED
+               for partition in stats.get('partitions', []) for segment in partition.get('segments') or [])
@@ -0,0 +1,124 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+PHASES = ('parse', 'rpc', 'frame', 'other', 'render', 'send')
+
+current = contextvars.ContextVar('milvus_kernel_timing', default=None)
+
+
+class StatementTiming:
+    """Wall time of one statement, split into parse, rpc, frame, render and send.
+
+    A phase counts the wall time during which at least one call of it is running, so RPCs
+    made from several worker threads at once are not added up.
+    """
+    def __init__(self, plan, parse=0.):
+        self.kind = plan.kind
+        self.collection = plan.collection
+        self.seconds = {'parse':parse}
+        self.running = {}
+        self.lock = threading.Lock()
+
+    def enter(self, phase):
+        with self.lock:
+            count, since = self.running.get(phase, (0, None))
+            self.running[phase] = (count+1, time.perf_counter() if count==0 else since)
+
+    def exit(self, phase):
+        with self.lock:
+            count, since = self.running[phase]
+            self.running[phase] = (count-1, since)
+            if count==1:
+                self.seconds[phase] = self.seconds.get(phase, 0.)+time.perf_counter()-since
+
+    @contextmanager
+    def phase(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit(name)
+
+    def breakdown(self):
+        """Milliseconds per phase; `other` is execution time not spent in RPCs or building frames,
+        and `total` is the wall time of parse, execute, render and send."""
+        seconds = dict(self.seconds)
+        execute = seconds.pop('execute', 0.)
+        seconds['other'] = max(0., execute-seconds.get('rpc', 0.)-seconds.get('frame', 0.))
+        ms = {i:seconds.get(i, 0.)*1000 for i in PHASES}
+        ms['total'] = (seconds['parse']+execute+seconds.get('render', 0.)+seconds.get('send', 0.))*1000
+        return ms
+
+    def footer(self):
+        return ' | '.join(f'{i} {v:.3f} ms' for i, v in self.breakdown().items())+'\n'
+
+
+@contextmanager
+def timed(phase):
+    timing = current.get()
+    if timing is None:
+        yield
+    else:
+        with timing.phase(phase):
+            yield
+
+
+def frame(*args, **kwargs):
+    with timed('frame'):
+        return pd.DataFrame(*args, **kwargs)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """`pool.submit` that carries the current statement timing into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TimedClient:
+    """Wraps a Milvus client so every call counts towards the `rpc` phase of the running statement."""
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            with timed('rpc'):
+                return attr(*args, **kwargs)
+        return call
+
+
+class Profiler:
+    """Session-wide latency samples per statement type and collection."""
+    def __init__(self, maxlen=100000):
+        self.samples = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+
+    def record(self, timing):
+        with self.lock:
+            self.samples.append((timing.kind, timing.collection or '', timing.breakdown()))
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def frame(self):
+        with self.lock:
+            samples = list(self.samples)
+        groups = {}
+        for kind, collection, ms in samples:
+            groups.setdefault((kind, collection), []).append([ms[i] for i in PHASES+('total',)])
+        rows = []
+        for (kind, collection), values in sorted(groups.items()):
+            values = np.array(values)
+            p50, p95, p99 = np.percentile(values[:, -1], [50, 95, 99])
+            rows.append([kind, collection, len(values), p50, p95, p99]+values[:, :-1].mean(axis=0).tolist())
+        return pd.DataFrame(rows, columns=['statement', 'collection', 'count', 'p50_ms', 'p95_ms', 'p99_ms']
+                                          +[f'mean_{i}_ms' for i in PHASES]).round(3)
@@ -0,0 +1,74 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .timing import submit
+
+
+def open_vectors(path):
+    """Memory-map a .npy, .fvecs or .bvecs file as a 2-D array without reading it into RAM; a 1-D .npy is one vector."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext=='.npy':
+        data = np.load(path, mmap_mode='r')
+        return data.reshape(1, -1) if data.ndim==1 else data
+    if ext=='.fvecs':
+        raw = np.memmap(path, dtype='int32', mode='r')
+        dim = int(raw[0])
+        return raw.reshape(-1, dim+1)[:, 1:].view('float32')
+    if ext=='.bvecs':
+        raw = np.memmap(path, dtype='uint8', mode='r')
+        dim = int(raw[:4].view('int32')[0])
+        return raw.reshape(-1, dim+4)[:, 4:]
+    raise ValueError(f"Unsupported vector file '{path}', expected .npy, .fvecs or .bvecs.")
+
+
+def open_ids(path):
+    """Memory-map a 1-D id file (.npy or .ivecs)."""
+    if path.lower().endswith('.ivecs'):
+        raw = np.memmap(path, dtype='int32', mode='r')
+        return raw.reshape(-1, int(raw[0])+1)[:, 1:].reshape(-1)
+    return np.load(path, mmap_mode='r').reshape(-1)
+
+
+def as_records(chunk):
+    """Turn a zero-copy slice into the contiguous float32 block handed to the client."""
+    return np.ascontiguousarray(chunk, dtype='float32')
+
+
+def pipeline_insert(engine, collection_name, vectors, ids=None, partition_tag=None, batch_size=10000, progress=None):
+    """Stream `vectors` into `engine.insert` one batch at a time.
+
+    The next batch is sliced and converted while the previous one is still in flight,
+    so the load runs at the pace of the server. `progress(rows, total, seconds)` is called
+    after every acknowledged batch.
+    """
+    total = len(vectors)
+    if ids is not None and len(ids)!=total:
+        raise ValueError(f'Got {len(ids)} ids for {total} vectors.')
+    inserted = []
+    start = time.perf_counter()
+
+    def collect(future):
+        status, batch_ids = future.result()
+        if not status.OK():
+            raise Exception(status.message)
+        inserted.append(np.asarray(batch_ids, dtype='int64'))
+        if progress is not None:
+            progress(sum(len(i) for i in inserted), total, time.perf_counter()-start)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        for offset in range(0, total, batch_size):
+            records = as_records(vectors[offset:offset+batch_size])
+            batch_ids = None if ids is None else ids[offset:offset+batch_size].tolist()
+            if pending is not None:
+                collect(pending)
+            pending = submit(pool, engine.insert, collection_name=collection_name, records=records,
+                             ids=batch_ids, partition_tag=partition_tag)
+        if pending is not None:
+            collect(pending)
+    seconds = time.perf_counter()-start
+    inserted = np.concatenate(inserted) if inserted else np.empty(0, dtype='int64')
+    return inserted, seconds
@@ -15,11 +15,11 @@ setup(name='milvus_kernel',
       author_email='hourout@163.com',
       keywords=['jupyter_kernel', 'milvus_kernel', 'milvus'],
       license='Apache License Version 2.0',
-      install_requires=['pymilvus', 'pandas', 'jupyter'],
+      python_requires='>=3.7',
+      install_requires=['pymilvus', 'numpy', 'pandas', 'jupyter'],
       classifiers = [
           'Framework :: IPython',
           'License :: OSI Approved :: Apache Software License',
-          'Programming Language :: Python :: 3.6',
           'Programming Language :: Python :: 3.7',
           'Programming Language :: Python :: 3.8',
           'Intended Audience :: Developers',
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+
+from milvus_kernel.local import LocalMilvus
+from milvus_kernel.bench import exact_neighbors
+
+
+DIMENSION = 16
+NLIST = 16
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return rng.random((2000, DIMENSION), dtype='float32'), rng.random((20, DIMENSION), dtype='float32')
+
+
+def create(engine, base, metric='L2'):
+    assert engine.create_collection({'collection_name':'c', 'dimension':DIMENSION, 'metric_type':metric}).OK()
+    status, ids = engine.insert('c', base)
+    assert status.OK()
+    return np.asarray(ids)
+
+
+def search(engine, queries, top_k=10, **params):
+    status, result = engine.search('c', top_k, queries, params=params or None)
+    assert status.OK()
+    return np.array(result.id_array), np.array(result.distance_array)
+
+
+@pytest.mark.parametrize('metric', ['L2', 'IP'])
+def test_flat_matches_brute_force(data, metric):
+    base, queries = data
+    engine = LocalMilvus()
+    try:
+        ids = create(engine, base, metric)
+        found, _ = search(engine, queries)
+        np.testing.assert_array_equal(found, exact_neighbors(queries, base, 10, metric, ids))
+    finally:
+        engine.close()
+
+
+@pytest.mark.parametrize('metric', ['L2', 'IP'])
+def test_ivf_probing_every_list_matches_flat(data, metric):
+    base, queries = data
+    engine = LocalMilvus()
+    try:
+        create(engine, base, metric)
+        flat_ids, flat_distances = search(engine, queries)
+        assert engine.create_index('c', 'IVF_FLAT', {'nlist':NLIST}).OK()
+        ivf_ids, ivf_distances = search(engine, queries, nprobe=NLIST)
+        np.testing.assert_array_equal(ivf_ids, flat_ids)
+        np.testing.assert_allclose(ivf_distances, flat_distances, rtol=1e-5)
+    finally:
+        engine.close()
+
+
+@pytest.mark.parametrize('index', [None, 'IVF_FLAT'])
+def test_deleted_rows_are_hidden(data, index):
+    base, queries = data
+    engine = LocalMilvus()
+    try:
+        create(engine, base)
+        if index is not None:
+            engine.create_index('c', index, {'nlist':NLIST})
+        nearest, _ = search(engine, queries, nprobe=NLIST)
+        deleted = np.unique(nearest[:, 0])
+        assert engine.delete_entity_by_id('c', deleted.tolist()).OK()
+        found, _ = search(engine, queries, nprobe=NLIST)
+        assert not np.isin(found, deleted).any()
+        assert engine.count_entities('c')[1]==len(base)-len(deleted)
+        assert engine.get_entity_by_id('c', deleted[:1].tolist())[1]==[[]]
+    finally:
+        engine.close()
+
+
+def test_reopened_directory_returns_same_results(data, tmp_path):
+    base, queries = data
+    engine = LocalMilvus(str(tmp_path))
+    create(engine, base)
+    engine.create_partition('c', '../escape')
+    engine.insert('c', base[:5], partition_tag='../escape')
+    engine.create_index('c', 'IVF_FLAT', {'nlist':NLIST})
+    engine.delete_entity_by_id('c', [0, 1])
+    expected = search(engine, queries, nprobe=4)
+    engine.close()
+
+    engine = LocalMilvus(str(tmp_path))
+    try:
+        found = search(engine, queries, nprobe=4)
+        np.testing.assert_array_equal(found[0], expected[0])
+        np.testing.assert_allclose(found[1], expected[1], rtol=1e-5)
+        assert engine.count_entities('c')[1]==len(base)+5-2
+        assert sorted(i.tag for i in engine.list_partitions('c')[1])==['../escape', '_default']
+    finally:
+        engine.close()
+    assert not os.path.exists(tmp_path.parent/'escape.vectors')
+
+
+def test_unflushed_rows_survive_reopen(data, tmp_path):
+    base, _ = data
+    engine = LocalMilvus(str(tmp_path))
+    create(engine, base[:10])
+    # No flush and no close: the memory maps and the row counts in meta.json are all there is.
+    engine = LocalMilvus(str(tmp_path))
+    try:
+        assert engine.count_entities('c')[1]==10
+    finally:
+        engine.close()
+
+
+def test_temporary_directory_is_removed_on_close():
+    engine = LocalMilvus()
+    path = engine.path
+    engine.create_collection({'collection_name':'c', 'dimension':DIMENSION})
+    engine.close()
+    assert not os.path.exists(path)
+
+
+def test_invalid_names_are_rejected():
+    engine = LocalMilvus()
+    try:
+        assert not engine.create_collection({'collection_name':'../c', 'dimension':DIMENSION}).OK()
+        engine.create_collection({'collection_name':'c', 'dimension':DIMENSION})
+        assert not engine.create_partition('c', '').OK()
+        assert not engine.create_partition('c', '_default').OK()
+    finally:
+        engine.close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from milvus_kernel.parser import parse, split_statements, MilvusSQLSyntaxError
+
+
+def test_split_statements_keeps_quoted_semicolons():
+    assert split_statements("select 'a;b.npy' from t where top_k=1; ; list table ") == \
+        ["select 'a;b.npy' from t where top_k=1", 'list table']
+
+
+def test_select_vectors():
+    plan = parse("select 1,2,3 from test01 where top_k=10 and nprobe=16 and partition_tags='a','b'")
+    assert plan.kind=='search'
+    assert plan.collections==('test01',)
+    np.testing.assert_array_equal(plan.args['vectors'], [[1, 2, 3]])
+    assert plan.args['top_k']==10
+    assert plan.args['nq']==1024
+    assert plan.args['params']=={'nprobe':16}
+    assert plan.args['partition_tags']==['a', 'b']
+
+
+def test_select_from_file_on_connections():
+    plan = parse("select 'q.npy' from test01 on shardA, shardB where top_k=5 and nq=100")
+    assert plan.args['path']=='q.npy'
+    assert plan.args['connections']==('shardA', 'shardB')
+    assert plan.args['nq']==100
+
+
+@pytest.mark.parametrize('statement, message', [
+    ('select 1,2 from t where top_k=0', 'top_k must be positive'),
+    ('select 1,2 from t where top_k=5 and nq=-1', 'nq must be positive'),
+    ("insert from 'a.npy' into t where batch_size=0", 'batch_size must be positive'),
+    ("insert from 'a.npy' into t by ids from 'i.npy' batch_size=-5", 'batch_size must be positive'),
+    ("select t by id between 0 and 9 into 'x.npy' batch_size=0", 'batch_size must be positive'),
+    ('select 1,2 from t where nprobe=16', "missing required parameter 'top_k'"),
+])
+def test_invalid_values(statement, message):
+    with pytest.raises(MilvusSQLSyntaxError, match=message):
+        parse(statement)
+
+
+def test_error_points_at_value():
+    with pytest.raises(MilvusSQLSyntaxError) as error:
+        parse('select 1,2 from t where top_k=0')
+    assert str(error.value).splitlines()[-1].index('^')==str(error.value).splitlines()[-2].index('top_k=0')+len('top_k=')
+
+
+@pytest.mark.parametrize('value, tag', [('2021', '2021'), ("'tag 01'", 'tag 01'), ('tag01', 'tag01'), ('1.50', '1.50')])
+def test_partition_tag_values(value, tag):
+    assert parse(f'create partition t where partition_tag={value}').args['partition_tag']==tag
+    assert parse(f'insert 1,2 from t where partition_tag={value}').args['partition_tag']==tag
+
+
+def test_insert_from_file():
+    plan = parse("insert from 'base.npy' into t where partition_tag='p' by ids from 'ids.npy' batch_size=500")
+    assert plan.kind=='insert_file'
+    assert plan.args=={'path':'base.npy', 'ids_path':'ids.npy', 'partition_tag':'p', 'batch_size':500}
+
+
+def test_set():
+    assert parse('set page_kb=64').args['value']==64
+    with pytest.raises(MilvusSQLSyntaxError, match='page_size must be positive'):
+        parse('set page_size=0')